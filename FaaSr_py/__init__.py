@@ -1,44 +1,110 @@
 # __init__.py
 
-from . import global_faasr
+import importlib
 
-
-# import functions
-from .graph_functions import faasr_replace_values
+# faasr_start is imported eagerly: its module has the same name, and importing the module
+# later would replace a lazily imported function on the package
 from .faasr_start import faasr_start
-from .put_file import faasr_put_file
-from .delete_file import faasr_delete_file
-from .get_file import faasr_get_file
-from .get_folder_list import faasr_get_folder_list
-from .log import faasr_log
-from .faasr_lock import faasr_acquire
-from .faasr_lock import faasr_release
-from .rank import faasr_rank
+
+# Functions of the package and the modules defining them
+# They are imported on first access (PEP 562), so "import FaaSr_py" does not load
+# boto3, requests and jsonschema until an API that needs them is used
+function_modules = {
+    "faasr_replace_values": "graph_functions",
+    "faasr_put_file": "put_file",
+    "faasr_put_files": "put_files",
+    "faasr_delete_file": "delete_file",
+    "faasr_delete_files": "delete_files",
+    "faasr_delete_prefix": "delete_files",
+    "faasr_get_file": "get_file",
+    "faasr_get_files": "get_files",
+    "faasr_get_folder_list": "get_folder_list",
+    "faasr_iter_folder_list": "get_folder_list",
+    "faasr_log": "log",
+    "faasr_acquire": "faasr_lock",
+    "faasr_release": "faasr_lock",
+    "faasr_rank": "rank",
+    "faasr_run_local": "local_runner",
+    "faasr_runtime_metrics": "global_faasr",
+    "faasr_get_range": "remote_file",
+    "faasr_open": "remote_file",
+    "faasr_get_bytes": "get_bytes",
+    "faasr_put_bytes": "put_bytes",
+    "faasr_iter_chunks": "stream_file",
+    "faasr_iter_lines": "stream_file",
+}
 
 __all__ = [
     # modules
     "log",
     "get_file",
+    "get_files",
     "delete_file",
+    "delete_files",
     "put_file",
+    "put_files",
     "rank",
     "get_folder_list",
     "faasr_payload",
     "faasr_lock",
     "faasr_start",
     "faasr_trigger",
+    "completion",
+    "fan_in_tree",
+    "payload_reference",
     "graph_functions",
     "s3_helper_functions",
     "global_faasr",
+    "tracing",
+    "local_s3",
+    "local_runner",
+    "file_cache",
+    "remote_file",
+    "get_bytes",
+    "put_bytes",
+    "stream_file",
 
     # functions
     "faasr_replace_values",
     "faasr_get_file",
+    "faasr_get_files",
     "faasr_delete_file",
+    "faasr_delete_files",
+    "faasr_delete_prefix",
     "faasr_get_folder_list",
+    "faasr_iter_folder_list",
     "faasr_log",
     "faasr_put_file",
+    "faasr_put_files",
     "faasr_rank",
     "faasr_release",
-    "faasr_acquire"
+    "faasr_acquire",
+    "faasr_run_local",
+    "faasr_runtime_metrics",
+    "faasr_get_range",
+    "faasr_open",
+    "faasr_get_bytes",
+    "faasr_put_bytes",
+    "faasr_iter_chunks",
+    "faasr_iter_lines"
 ]
+
+
+def __getattr__(name):
+    """
+    Imports a function or module of the package the first time it is accessed
+    """
+    if name in function_modules:
+        module = importlib.import_module(f".{function_modules[name]}", __name__)
+        value = getattr(module, name)
+    elif name in __all__:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Later accesses find the attribute without calling __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
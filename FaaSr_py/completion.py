@@ -0,0 +1,77 @@
+from botocore.exceptions import ClientError
+from .graph_functions import get_dag_analysis
+
+# Sub-folder of {FaaSrLog}/{InvocationID} holding the .done markers of finished actions
+# Keeping the markers apart from logs, flags and candidate files keeps the completion listing small
+DONE_FOLDER = "done"
+
+
+def get_done_name(payload_dict):
+    """
+    Returns the name under which the current action is marked as done:
+    FunctionInvoke, or FunctionInvoke.rank for ranked functions
+    """
+    done_name = payload_dict["FunctionInvoke"]
+    rank_unsplit = payload_dict["FunctionList"][done_name].get("Rank", "")
+    if len(rank_unsplit) != 0:
+        rank = rank_unsplit.split("/")[0]
+        done_name = f"{done_name}.{rank}"
+    return done_name
+
+
+def get_done_folder(id_folder):
+    """
+    Returns the folder of the .done markers of an invocation ({FaaSrLog}/{InvocationID}/done)
+    """
+    return f"{id_folder}/{DONE_FOLDER}"
+
+
+def expected_done_names(function_list, pre, analysis=None):
+    """
+    Returns the done names expected from the predecessors in pre
+
+    A ranked predecessor "Func(N)" is expanded into Func.1 ... Func.N
+    The number of ranks comes from the InvokeNext entries, since payloads
+    passed by reference do not carry the Rank fields of other functions
+    (analysis is the DAG analysis of the workflow, if it was already computed)
+    """
+    if analysis is None:
+        analysis = get_dag_analysis(function_list)
+    pre_ranks = analysis.Ranks
+    done_names = []
+    for pre_func in pre:
+        if pre_func in pre_ranks:
+            for rank in range(1, pre_ranks[pre_func] + 1):
+                done_names.append(f"{pre_func}.{rank}")
+        else:
+            done_names.append(pre_func)
+    return done_names
+
+
+def find_missing_done(s3_client, bucket, id_folder, done_names):
+    """
+    Returns the first of done_names that has no .done marker, or None if all predecessors are done
+
+    The done folder is listed page by page into a set (1000 markers per request), so the check
+    takes ceil(M / 1000) requests and O(N + M) time for N expected and M existing markers.
+    A marker missing from the done folder is looked up at the location used by older
+    versions ({id_folder}/{name}.done) before the predecessor is reported as not done
+    """
+    done_folder = get_done_folder(id_folder)
+    prefix = f"{done_folder}/"
+    done_keys = set()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for content in page.get("Contents", []):
+            done_keys.add(content["Key"])
+
+    for done_name in done_names:
+        if f"{prefix}{done_name}.done" in done_keys:
+            continue
+        try:
+            s3_client.head_object(Bucket=bucket, Key=f"{id_folder}/{done_name}.done")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return done_name
+            raise
+    return None
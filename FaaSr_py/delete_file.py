@@ -1,5 +1,4 @@
 import re
-import boto3
 import sys
 from . import global_faasr as faasr_env
 
@@ -23,6 +22,19 @@ def faasr_delete_file(remote_file, server_name="", remote_folder=""):
     # Get the S3 data store to delete file from
     target_s3 = config['DataStores'][server_name]
 
+    # Name of file to delete from S3
+    delete_file_s3 = delete_file_path(remote_file, remote_folder)
+
+    s3_client = config.get_s3_client(server_name)
+    
+    # Delete file from S3
+    result = s3_client.delete_object(Bucket = target_s3['Bucket'], Key = delete_file_s3)
+
+
+def delete_file_path(remote_file, remote_folder=""):
+    """
+    Returns the normalized S3 key of remote_file in remote_folder
+    """
     # Remove "/" in the folder & file name to avoid situations:x
     # 1: duplicated "/" ("/remote/folder/", "/file_name") 
     # 2: multiple "/" by user mistakes ("//remote/folder//", "file_name")
@@ -31,15 +43,9 @@ def faasr_delete_file(remote_file, server_name="", remote_folder=""):
     remote_file = re.sub(r'/+', '/', remote_file.rstrip('/'))
 
     # Name of file to delete from S3
-    delete_file_s3 = f"{remote_folder}/{remote_file}"
-
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id = target_s3['AccessKey'],
-        aws_secret_access_key = target_s3['SecretKey'],
-        region_name = target_s3['Region'],
-        endpoint_url = target_s3['Endpoint']
-        )
-    
-    # Delete file from S3
-    result = s3_client.delete_object(Bucket = target_s3['Bucket'], Key = delete_file_s3)
+    if remote_folder == "":
+        delete_file_s3 = remote_file
+    else:
+        delete_file_s3 = f"{remote_folder}/{remote_file}"
+
+    return delete_file_s3
@@ -0,0 +1,134 @@
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from . import global_faasr as faasr_env
+from .delete_file import delete_file_path
+from .s3_helper_functions import DEFAULT_BATCH_WORKERS
+
+# S3 DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+# Result of a bulk delete: keys that were deleted (faasr_delete_files) or their number (faasr_delete_prefix),
+# and (key, error message) pairs for keys that were not
+DeleteResult = namedtuple("DeleteResult", ["Deleted", "Errors"])
+
+
+def faasr_delete_files(remote_files, server_name="", remote_folder="", max_workers=DEFAULT_BATCH_WORKERS):
+    """
+    This function deletes many files from S3 with batched DeleteObjects requests
+
+    parameters:
+        remote_files(list): names of the files to delete, relative to remote_folder
+        max_workers(int): maximum number of batches deleted at the same time
+
+    returns a DeleteResult(Deleted, Errors); partial failures are reported instead of aborting the action
+    """
+    config = faasr_env.get_faasr()
+    server_name, target_s3 = get_delete_server(config, server_name, "faasr_delete_files")
+    s3_client = config.get_s3_client(server_name)
+
+    keys = [delete_file_path(remote_file, remote_folder) for remote_file in remote_files]
+    batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+
+    return delete_batches(s3_client, target_s3["Bucket"], batches, max_workers, "faasr_delete_files", True)
+
+
+def faasr_delete_prefix(prefix, server_name="", max_workers=DEFAULT_BATCH_WORKERS):
+    """
+    This function deletes every object under prefix from S3
+
+    Pages of the listing are deleted as they arrive, so deletion overlaps with listing and
+    only a few pages of keys are held in memory at a time
+
+    returns a DeleteResult(Deleted, Errors) where Deleted is the number of deleted objects;
+    partial failures are reported instead of aborting the action
+    """
+    config = faasr_env.get_faasr()
+    server_name, target_s3 = get_delete_server(config, server_name, "faasr_delete_prefix")
+    s3_client = config.get_s3_client(server_name)
+
+    # Refuse to delete the whole bucket by accident
+    if prefix is None or prefix == "":
+        err_msg = '{"faasr_delete_prefix":"prefix must not be empty"}\n'
+        print(err_msg)
+        sys.exit(1)
+
+    # Each page of list_objects_v2 holds at most 1000 keys, which is exactly one delete batch
+    def list_batches():
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=target_s3["Bucket"], Prefix=prefix):
+            keys = [content["Key"] for content in page.get("Contents", [])]
+            if keys:
+                yield keys
+
+    return delete_batches(s3_client, target_s3["Bucket"], list_batches(), max_workers, "faasr_delete_prefix", False)
+
+
+def get_delete_server(config, server_name, caller):
+    """
+    Returns the server name and data store to delete from, aborting if the server is invalid
+    """
+    # Get server name from payload if one isn't provided
+    if server_name == "":
+        server_name = config['DefaultDataStore']
+
+    # Ensure that the server is a valid data store
+    if server_name not in config['DataStores']:
+        err_msg = '{\"' + caller + '\":\"Invalid data server name: ' + server_name + '\"}\n'
+        print(err_msg)
+        sys.exit(1)
+
+    return server_name, config['DataStores'][server_name]
+
+
+def delete_batches(s3_client, bucket, batches, max_workers, caller, keep_keys):
+    """
+    Deletes batches of at most 1000 keys concurrently and merges the results
+
+    At most 2 * max_workers batches are in flight, so batches produced by a generator are not all held
+    in memory. If keep_keys is False, the result counts the deleted keys instead of listing them
+    """
+    def delete_batch(keys):
+        try:
+            response = s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+            )
+        except Exception as e:
+            return [], [(key, str(e)) for key in keys]
+        # In quiet mode only the keys that failed are returned
+        errors = [(error["Key"], error.get("Message", error.get("Code", ""))) for error in response.get("Errors", [])]
+        failed = {key for key, _ in errors}
+        return [key for key in keys if key not in failed], errors
+
+    deleted = [] if keep_keys else 0
+    deleted_count = 0
+    errors = []
+
+    def merge(future):
+        nonlocal deleted, deleted_count
+        batch_deleted, batch_errors = future.result()
+        deleted_count += len(batch_deleted)
+        if keep_keys:
+            deleted.extend(batch_deleted)
+        else:
+            deleted += len(batch_deleted)
+        errors.extend(batch_errors)
+
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = set()
+        for batch in batches:
+            if len(in_flight) >= 2 * max_workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future)
+            in_flight.add(executor.submit(delete_batch, batch))
+        for future in in_flight:
+            merge(future)
+
+    if errors:
+        err_msg = f'{{"{caller}":"{len(errors)} of {deleted_count + len(errors)} objects could not be deleted"}}\n'
+        print(err_msg)
+
+    return DeleteResult(deleted, errors)
@@ -1,8 +1,34 @@
+import json
 import random
 import time
 import sys
-import boto3
+import uuid
+from botocore.exceptions import ClientError
+from .s3_helper_functions import (
+    s3_client_registry, is_precondition_failed, is_conditional_write_unsupported, conditional_put
+)
 
+# Lock backends, selected with the "LockBackend" field of the logging data store
+#   conditional: one lock object created and taken over with conditional puts (If-None-Match/If-Match)
+#   flag: flag objects and listings, for data stores without conditional writes
+LOCK_BACKEND_CONDITIONAL = "conditional"
+LOCK_BACKEND_FLAG = "flag"
+
+# Default lease of a conditional lock in seconds; a lock that is not released
+# within its lease (e.g. because its holder crashed) can be taken over
+# Can be overridden with the "LockTTL" payload field
+DEFAULT_LOCK_TTL = 60
+
+# Default time in seconds faasr_acquire waits for a conditional lock before the action aborts
+# Can be overridden with the "LockTimeout" payload field
+DEFAULT_LOCK_TIMEOUT = 120
+
+# Bounds of the jittered exponential backoff between acquire attempts, in seconds
+LOCK_BACKOFF_BASE = 0.05
+LOCK_BACKOFF_MAX = 2
+
+# lock key -> (ETag, fencing token) of the conditional locks held by this process
+held_locks = {}
 
 
 def faasr_rsm(faasr_payload):
@@ -20,13 +46,7 @@ def faasr_rsm(faasr_payload):
     logging_server = faasr_payload.get_logging_server()
     target_s3 = faasr_payload['DataStores'][logging_server]
 
-    s3_client = boto3.client(
-                            's3',
-                            aws_access_key_id = target_s3['AccessKey'],
-                            aws_secret_access_key = target_s3['SecretKey'],
-                            region_name = target_s3['Region'],
-                            endpoint_url = target_s3['Endpoint']
-    )
+    s3_client = faasr_payload.get_s3_client(logging_server)
 
     cnt = 0
     max_cnt = 4
@@ -65,6 +85,27 @@ def faasr_rsm(faasr_payload):
 def faasr_acquire(faasr):
     """
     This function acquires the lock and leaves a lock object in s3
+
+    returns the fencing token of the lock: it increases every time the lock changes hands,
+    so writes guarded by the lock can be ordered (always True with the flag backend)
+
+    The lease of a conditional lock is not renewed: the work done under the lock must finish well within
+    LockTTL seconds, or another action may take the lock over while it runs (faasr_release then reports
+    the expired lease). The data store does not check the fencing token; a guarded write that must be
+    rejected after a takeover has to compare it itself (e.g. by storing it with the data and writing with IfMatch)
+    """
+    if get_lock_backend(faasr) == LOCK_BACKEND_CONDITIONAL:
+        token = faasr_acquire_conditional(faasr)
+        if token is not None:
+            return token
+        # The data store does not implement conditional writes, so fall back to flags
+        print('{\"faasr_acquire\":\"conditional writes not supported, using flag lock\"}\n')
+    return faasr_acquire_flag(faasr)
+
+
+def faasr_acquire_flag(faasr):
+    """
+    This function acquires the lock with the flag protocol of faasr_rsm
     """
     # Call faasr_rsm to get a lock
     lock = faasr_rsm(faasr)
@@ -93,25 +134,167 @@ def faasr_acquire(faasr):
         lock = faasr_rsm(faasr)
 
 
+def faasr_acquire_conditional(faasr_payload):
+    """
+    This function acquires the lock with conditional puts on a single lock object
+
+    Without contention, the first acquisition takes one request; later ones take three (see try_lock),
+    since the released lock object is kept. Otherwise, attempts are retried with jittered,
+    bounded exponential backoff until LockTimeout seconds have passed
+
+    returns the fencing token, or None if the data store does not implement conditional writes
+    """
+    payload_dict = faasr_payload.get_payload_dict()
+    lock_key = get_lock_name(faasr_payload)
+    lock_ttl = float(payload_dict.get("LockTTL", DEFAULT_LOCK_TTL))
+    lock_timeout = float(payload_dict.get("LockTimeout", DEFAULT_LOCK_TIMEOUT))
+
+    # set env for storage
+    logging_server = faasr_payload.get_logging_server()
+    target_s3 = faasr_payload['DataStores'][logging_server]
+    s3_client = faasr_payload.get_s3_client(logging_server)
+
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + lock_timeout
+    attempt = 0
+    while True:
+        try:
+            token = try_lock(s3_client, target_s3['Bucket'], lock_key, owner, lock_ttl)
+        except ClientError as e:
+            if is_conditional_write_unsupported(e):
+                return None
+            raise
+        if token is not None:
+            return token
+
+        # Back off for a random time below an exponentially growing, bounded cap
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            err_msg = '{\"faasr_acquire\":\"Lock Acquire Timeout\"}\n'
+            print(err_msg)
+            sys.exit(1)
+        backoff_cap = min(LOCK_BACKOFF_MAX, LOCK_BACKOFF_BASE * 2 ** attempt)
+        time.sleep(min(remaining, random.uniform(0, backoff_cap)))
+        attempt += 1
+
+
+def try_lock(s3_client, bucket, lock_key, owner, lock_ttl):
+    """
+    Makes one attempt to acquire the lock object lock_key
+
+    The lock object holds the owner, the fencing token, the lease expiry and whether it was released.
+    Releasing the lock keeps the object, so that the fencing token keeps increasing: creating the lock takes
+    one request, and taking over a released or expired lock takes three (failed create, read, conditional put)
+
+    returns the fencing token if the lock was acquired, or None if another action holds it
+    """
+    # Create the lock if it does not exist; this is the only request needed for the first acquisition
+    try:
+        response = conditional_put(
+            s3_client, Bucket=bucket, Key=lock_key, Body=lock_body(owner, 1, lock_ttl), IfNoneMatch="*"
+        )
+        held_locks[lock_key] = (response["ETag"], 1)
+        return 1
+    except ClientError as e:
+        if not is_precondition_failed(e):
+            raise
+
+    # The lock exists: read it to see whether it is still held
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=lock_key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    try:
+        lock_state = json.loads(response["Body"].read())
+    except ValueError:
+        lock_state = None
+    if not isinstance(lock_state, dict):
+        # Lock written by the flag backend (its body is the flag number), which is held until it is deleted
+        return None
+
+    if not lock_state.get("Released", False) and lock_state.get("Expires", 0) > time.time():
+        return None
+
+    # The lock was released or its lease expired: take it over, unless someone else changed it first
+    token = int(lock_state.get("Token", 0)) + 1
+    try:
+        response = conditional_put(
+            s3_client, Bucket=bucket, Key=lock_key, Body=lock_body(owner, token, lock_ttl), IfMatch=response["ETag"]
+        )
+    except ClientError as e:
+        if is_precondition_failed(e):
+            return None
+        raise
+    held_locks[lock_key] = (response["ETag"], token)
+    return token
+
+
+def lock_body(owner, token, lock_ttl, released=False):
+    """
+    Returns the content of a conditional lock object
+    """
+    return json.dumps({
+        "Owner": owner,
+        "Token": token,
+        "Expires": time.time() + lock_ttl,
+        "Released": released,
+    })
+
+
+def get_lock_name(faasr_payload):
+    """
+    Returns the key of the lock object: {FaaSrLog}/{InvocationID}/{FunctionInvoke}./lock
+    """
+    return f"{faasr_payload['FaaSrLog']}/{faasr_payload['InvocationID']}/{faasr_payload['FunctionInvoke']}./lock"
+
+
+def get_lock_backend(faasr_payload):
+    """
+    Returns the lock backend of the logging data store (conditional by default)
+    """
+    logging_server = faasr_payload.get_logging_server()
+    target_s3 = faasr_payload['DataStores'][logging_server]
+    backend = target_s3.get("LockBackend", LOCK_BACKEND_CONDITIONAL)
+    if backend not in (LOCK_BACKEND_CONDITIONAL, LOCK_BACKEND_FLAG):
+        err_msg = f'{{"faasr_acquire":"invalid LockBackend {backend} for data store {logging_server}"}}\n'
+        print(err_msg)
+        sys.exit(1)
+    return backend
+
+
 def faasr_release(faasr_payload):
     """
-    This function releases the lock by deleting the lock file from s3
+    This function releases the lock
+
+    A conditional lock is marked as released (keeping its fencing token), only if it was not taken over
+    after its lease expired; a flag lock is released by deleting the lock file from s3
     """
 
     # The lock file is in the form {FaaSrLog}/{InvocationID}/{FunctionInvoke}./lock
-    lock_name = f"{faasr_payload['FaaSrLog']}/{faasr_payload['InvocationID']}/{faasr_payload['FunctionInvoke']}./lock"
+    lock_name = get_lock_name(faasr_payload)
 
     # Get the faasr logging server from payload
     logging_server = faasr_payload.get_logging_server()
     target_s3 = faasr_payload['DataStores'][logging_server]
 
-    s3_client = boto3.client(
-                            's3',
-                            aws_access_key_id = target_s3['AccessKey'],
-                            aws_secret_access_key = target_s3['SecretKey'],
-                            region_name = target_s3['Region'],
-                            endpoint_url = target_s3['Endpoint']
-    )
+    s3_client = faasr_payload.get_s3_client(logging_server)
+
+    held_lock = held_locks.pop(lock_name, None)
+    if held_lock is not None:
+        etag, token = held_lock
+        try:
+            conditional_put(
+                s3_client, Bucket=target_s3['Bucket'], Key=lock_name,
+                Body=lock_body("", token, 0, released=True), IfMatch=etag,
+            )
+        except ClientError as e:
+            if not is_precondition_failed(e):
+                raise
+            err_msg = f'{{"faasr_release":"lock lease expired before release (token {token})"}}\n'
+            print(err_msg)
+        return
 
     # Delete the lock from S3
     s3_client.delete_object(Bucket = target_s3['Bucket'], Key = lock_name)
@@ -123,13 +306,7 @@ def anyone_else_interested(target_s3, flag_path, flag_name):
     This function checks flags to see whether or not other
     functions are trying to acquire the lock
     """
-    s3_client = boto3.client(
-            's3',
-            aws_access_key_id = target_s3['AccessKey'],
-            aws_secret_access_key = target_s3['SecretKey'],
-            region_name = target_s3['Region'],
-            endpoint_url = target_s3['Endpoint']
-    )
+    s3_client = s3_client_registry.get_client(target_s3)
 
     # Get a list of flag names
     check_pool = s3_client.list_objects_v2(Bucket=target_s3['Bucket'], Prefix=flag_path)
@@ -1,16 +1,24 @@
 import uuid
 import json
-import boto3
 import random
-import re
-import copy
-import requests
-import os
 import sys
+import time
 import FaaSr_py
+from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
-from .s3_helper_functions import validate_uuid
-from .graph_functions import validate_json
+from .s3_helper_functions import validate_uuid, s3_client_registry, verified_data_stores, data_store_check_key
+from .s3_helper_functions import DEFAULT_S3_CHECK_TTL, DEFAULT_S3_CHECK_TIMEOUT
+from .s3_helper_functions import is_precondition_failed, is_conditional_write_unsupported, conditional_put
+from botocore.exceptions import ClientError
+from .graph_functions import validate_json, parse_invoke_next, get_dag_analysis
+from . import faasr_trigger
+from . import payload_reference
+from .fan_in_tree import report_to_tree
+from .tracing import trace_span, flush_trace
+from .completion import get_done_name, get_done_folder, expected_done_names, find_missing_done
+from .faasr_trigger import DEFAULT_TRIGGER_WORKERS, DEFAULT_TRIGGER_RETRIES
+from .faasr_lock import get_lock_backend, LOCK_BACKEND_CONDITIONAL
+from .global_faasr import runtime
 
 
 class FaaSr:
@@ -19,6 +27,10 @@ class FaaSr:
             self.payload_dict = faasr_payload
         else:
             ValueError("Payload validation error")
+        # S3 clients are shared across invocations through the module level registry
+        self.s3_clients = s3_client_registry
+        # DAG analysis of the workflow, computed on first use
+        self.dag_analysis = None
         # self.branches = []
 
     def __getitem__(self, key):
@@ -39,6 +51,15 @@ class FaaSr:
     def set_payload_dict(self, payload_dict):
         if validate_json(json.dump(payload_dict)):
             self.payload_dict = payload_dict
+            self.dag_analysis = None
+
+    def get_dag_analysis(self):
+        """
+        Returns the DAG analysis of the workflow, computed once per payload
+        """
+        if self.dag_analysis is None:
+            self.dag_analysis = get_dag_analysis(self.payload_dict["FunctionList"])
+        return self.dag_analysis
 
     def get_payload_json(self):
         try:
@@ -47,13 +68,33 @@ class FaaSr:
             err_msg = '{"get_payload_json":"self.payload_dict must be a dictionary"}\n'
             print(err_msg)
 
-    def s3_check(self):
+    def get_s3_client(self, server_name):
+        """
+        Returns the pooled S3 client for the data store server_name
+        """
+        return self.s3_clients.get_client(self.payload_dict["DataStores"][server_name])
+
+    def s3_check(self, only_used=None):
         """
         Ensures that all of the S3 data stores are valid and reachable
+
+        Data stores are checked concurrently with a per-check timeout, and successful checks are
+        cached in the container for S3CheckTTL seconds. If only_used is True (or the payload sets
+        S3CheckUsedOnly), only the data stores used by the current function are checked
         """
-        
-        # Iterate through all of the data stores
-        for server in self.payload_dict["DataStores"].keys():
+        if only_used is None:
+            only_used = self.payload_dict.get("S3CheckUsedOnly", False)
+        check_ttl = float(self.payload_dict.get("S3CheckTTL", DEFAULT_S3_CHECK_TTL))
+        check_timeout = float(self.payload_dict.get("S3CheckTimeout", DEFAULT_S3_CHECK_TIMEOUT))
+
+        if only_used:
+            servers = self.get_used_data_stores()
+        else:
+            servers = list(self.payload_dict["DataStores"].keys())
+
+        # Iterate through the data stores
+        to_check = []
+        for server in servers:
             # Get the endpoint and region
             server_endpoint = self.payload_dict["DataStores"][server]["Endpoint"]
             server_region = self.payload_dict["DataStores"][server]["Region"]
@@ -73,22 +114,63 @@ class FaaSr:
                 # to-do: continue if anonymous is true
                 print("anonymous param not implemented")
 
-            s3_client = boto3.client(
-                "s3",
-                aws_access_key_id=self.payload_dict["DataStores"][server]["AccessKey"],
-                aws_secret_access_key=self.payload_dict["DataStores"][server]["SecretKey"],
-                region_name=self.payload_dict["DataStores"][server]["Region"],
-                endpoint_url=self.payload_dict["DataStores"][server]["Endpoint"],
-            )
-            # Use boto3 head bucket to ensure that the bucket exists and that we have acces to it
-            try:
-                bucket_check = s3_client.head_bucket(
-                    Bucket=self.payload_dict["DataStores"][server]["Bucket"]
-                )
-            except Exception as e:
-                error_message = f'{{"s3_check":"S3 server {server} failed with message: {e}}}\n'
+            # Skip data stores that a previous invocation in this container already verified
+            check_key = data_store_check_key(self.payload_dict["DataStores"][server])
+            verified = verified_data_stores.get(check_key, 0) > time.monotonic()
+            runtime.record("DataStoreChecks", verified)
+            if verified:
+                continue
+            to_check.append(server)
+
+        if len(to_check) == 0:
+            return
+
+        def check(server):
+            # Use boto3 head bucket to ensure that the bucket exists and that we have acces to it.
+            # The time limit is enforced by the client, whose connect and read timeouts add up to
+            # check_timeout and which does not retry, so no check outlives the action
+            target_s3 = self.payload_dict["DataStores"][server]
+            s3_client = self.s3_clients.get_client(target_s3, timeout=check_timeout / 2)
+            s3_client.head_bucket(Bucket=target_s3["Bucket"])
+
+        # Check the data stores concurrently
+        with ThreadPoolExecutor(max_workers=len(to_check)) as executor:
+            futures = {executor.submit(check, server): server for server in to_check}
+
+        failed = False
+        for future, server in futures.items():
+            if future.exception() is not None:
+                error_message = f'{{"s3_check":"S3 server {server} failed with message: {future.exception()}"}}\n'
                 print(error_message)
-                sys.exit(1)
+                failed = True
+            else:
+                check_key = data_store_check_key(self.payload_dict["DataStores"][server])
+                verified_data_stores[check_key] = time.monotonic() + check_ttl
+        if failed:
+            sys.exit(1)
+
+    def get_used_data_stores(self):
+        """
+        Returns the data stores used by the current function: the default and logging data stores,
+        and any data store whose name appears in the function's arguments
+        """
+        data_stores = self.payload_dict["DataStores"]
+        used = [self.payload_dict["DefaultDataStore"], self.get_logging_server()]
+
+        # Look for data store names in the (possibly nested) arguments
+        curr_func = self.payload_dict["FunctionList"][self.payload_dict["FunctionInvoke"]]
+        pending = [curr_func.get("Arguments")]
+        while pending:
+            value = pending.pop()
+            if isinstance(value, dict):
+                pending.extend(value.values())
+            elif isinstance(value, list):
+                pending.extend(value)
+            elif isinstance(value, str) and value in data_stores:
+                used.append(value)
+
+        # Remove duplicates and names that are not data stores, keeping the order
+        return [server for server in dict.fromkeys(used) if server in data_stores]
 
     def init_log_folder(self):
         """
@@ -108,20 +190,14 @@ class FaaSr:
         target_s3 = self.get_logging_server()
         s3_log_info = self.payload_dict["DataStores"][target_s3]
 
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=s3_log_info["AccessKey"],
-            aws_secret_access_key=s3_log_info["SecretKey"],
-            region_name=s3_log_info["Region"],
-            endpoint_url=s3_log_info["Endpoint"],
-        )
+        s3_client = self.get_s3_client(target_s3)
 
         # If no name for log specified, use 'FaaSrLog'
         if self.payload_dict["FaaSrLog"] is None or self.payload_dict["FaaSrLog"] == "":
             self.payload_dict["FaaSrLog"] = "FaaSrLog"
 
         # Get name for log folder
-        idfolder = f"{self.payload_dict["FaaSrLog"]}/{self.payload_dict["InvocationID"]}/"
+        idfolder = f"{self.payload_dict['FaaSrLog']}/{self.payload_dict['InvocationID']}/"
         
         # Check contents of log folder
         check_id_folder = s3_client.list_objects_v2(
@@ -140,7 +216,7 @@ class FaaSr:
         """
         Invoked when the current function has multiple predecessors
         and aborts if they have not finished or the current function instance was not
-        the first to write to the candidate set
+        elected to proceed (the creator of the winner object, or the first to write to the candidate set)
         """
 
         # Get S3 logging data store
@@ -153,122 +229,107 @@ class FaaSr:
         
         s3_log_info = self.payload_dict["DataStores"][target_s3]
 
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=s3_log_info["AccessKey"],
-            aws_secret_access_key=s3_log_info["SecretKey"],
-            region_name=s3_log_info["Region"],
-            endpoint_url=s3_log_info["Endpoint"],
-        )
+        s3_client = self.get_s3_client(target_s3)
 
         # ID folder is of the form {faasr log}/{InvocationID}
         id_folder = (
             f"{self.payload_dict['FaaSrLog']}/{self.payload_dict['InvocationID']}"
         )
 
-        # If a predecessor has a rank attribute, then we need to ensure
-        # That all concurrent invocations of that function have finished
-        for pre_func in pre:
-            if "Rank" in self.payload_dict["FunctionList"][pre_func] and len(self.payload_dict["FunctionList"][pre_func]["Rank"]) != 0:
-                parts = self.payload_dict["FunctionList"][pre_func]["Rank"].split("/")
-                pre.remove(pre_func)
-                if len(parts) != 2:
-                    err_msg = f'{{\"faasr_abort_on_multiple_invocation\": \"Error with rank field in function: {pre_func}\"}}'
-                    print(err_msg)
-                    sys.exit(1)
-                for rank in range(1, int(parts[1]) + 1):
-                    pre.append(f"{pre_func}.{rank}")
-
         # First, we check if all of the other predecessor actions are done
-        # To do this, we check a file called func.done in S3, and see if all of the other actions have
-        # written that they are "done"
+        # To do this, we check the func.done markers in the done folder, and see if all of the other actions have
+        # written that they are "done" (ranked predecessors write one marker per rank)
         # If not all of the predecessor's are finished, then this action aborts
-        s3_list_object_response = s3_client.list_objects_v2(
-            Bucket=s3_log_info["Bucket"], Prefix=id_folder
-        )
-        s3_contents = s3_list_object_response["Contents"]
-
-        # Extract paths from s3 contents
-        s3_object_keys = []
-        for object in s3_contents:
-            if "Key" in object:
-                s3_object_keys.append(object["Key"])
-
-        for func in pre:
-            # check if all of the predecessor func.done objects exist
-            done_file = f"{id_folder}/{func}.done"
-
-            # if the object does exist, do nothing
-            # if it does not exist, then the current function still is waiting for
-            # a predecessor and must wait
-            if done_file not in s3_object_keys:
-                res_msg = '{"faasr_abort_on_multiple_invocations":"not the last trigger invoked - no flag"}\n'
-                print(res_msg)
-                sys.exit(1)
+        done_names = expected_done_names(self.payload_dict["FunctionList"], pre, self.get_dag_analysis())
+        missing = find_missing_done(s3_client, s3_log_info["Bucket"], id_folder, done_names)
+        if missing is not None:
+            res_msg = '{"faasr_abort_on_multiple_invocations":"not the last trigger invoked - no flag"}\n'
+            print(res_msg)
+            sys.exit(1)
 
         # Step 2: This code is reached only if all predecessors are done. Now we need to select only one Action to proceed,
         # while all other Actions should abort
-        # We use a lock implementation over S3 to implement atomic read/modify/write operations and avoid a race condition
+        # With conditional writes, the winner is the action that creates the "FunctionInvoke.winner" object
+        if get_lock_backend(self) == LOCK_BACKEND_CONDITIONAL:
+            won = self.elect_winner(s3_client, s3_log_info["Bucket"], id_folder)
+            if won is False:
+                res_msg = '{"abort_on_multiple_invocations":"not the last trigger invoked - another invocation won the election"}\n'
+                print(res_msg)
+                sys.exit(1)
+            if won is True:
+                return
+
+        # Otherwise, we use a lock implementation over S3 to implement atomic read/modify/write operations and avoid a race condition
         # Between lock acquire and release, we do the following:
-        # 1) download the "FunctionInvoke.candidate" file from S3. The candidate file stores random numbers generated by
+        # 1) read the "FunctionInvoke.candidate" file from S3. The candidate file stores random numbers generated by
         #    each action which have been invoked for this function after all predecessors are done.
-        # 2) append a random number to the local file, which is generated by this Action
-        # 3) upload the file back to the S3 bucket
-        # 4) download the file from S3
+        # 2) append a random number, which is generated by this Action
+        # 3) upload the candidate set back to the S3 bucket
+        # 4) read the candidate set from S3 again
+        # The candidate set is kept in memory, so none of these steps go through /tmp
+        # This is only reached when the data store does not implement conditional writes, so the lock is always
+        # a flag lock, which has no lease; there is no fencing token to check on the candidate write
 
         FaaSr_py.faasr_acquire(self)
 
         random_number = random.randint(1, 2**31 - 1)
 
-        if not os.path.isdir(f"/tmp/{id_folder}"):
-            os.makedirs(f"/tmp/{id_folder}", exist_ok=True)
-
-        candidate_path = f"{id_folder}/{self.payload_dict['FunctionInvoke']}.candidate"
-        candidate_temp_path = f"/tmp/{candidate_path}"
+        candidate_file = f"{get_done_name(self.payload_dict)}.candidate"
 
-        # Get all of the objects in S3 with the prefix {id_folder}/{FunctionInvoke}.candidate
-        s3_response = s3_client.list_objects_v2(
-            Bucket=s3_log_info["Bucket"], Prefix=candidate_path
-        )
-        if 'Contents' in s3_response and len(s3_response["Contents"]) != 0:
-            # Download candidate set
-            if os.path.exists(candidate_temp_path):
-                os.remove(candidate_temp_path)          
-            s3_client.download_file(
-                Bucket=s3_log_info["Bucket"],
-                Key=candidate_path,
-                Filename=candidate_temp_path,
+        # Read the candidate set, which does not exist yet for the first candidate
+        try:
+            candidates = FaaSr_py.faasr_get_bytes(
+                server_name=target_s3, remote_folder=id_folder, remote_file=candidate_file
             )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                raise
+            candidates = b""
+
+        # Add unique random number to the candidate set and upload it back to S3
+        candidates += f"{random_number}\n".encode()
+        FaaSr_py.faasr_put_bytes(
+            candidates, server_name=target_s3, remote_folder=id_folder, remote_file=candidate_file
+        )
 
-        # Write unique random number to candidate file
-        with open(candidate_temp_path, "a") as cf:
-            cf.write(str(random_number) + "\n")
-
-        with open(candidate_temp_path, "rb") as cf:
-            # Upload candidate file back to S3
-            s3_client.put_object(
-                Body=cf, Key=candidate_path, Bucket=s3_log_info["Bucket"]
-            )
-            
-        # Download candidate file to local directory again
-        if os.path.exists(candidate_temp_path):
-            os.remove(candidate_temp_path)
-        s3_client.download_file(
-            Bucket=s3_log_info["Bucket"], Key=candidate_path, Filename=candidate_temp_path
+        # Read the candidate set again
+        candidates = FaaSr_py.faasr_get_bytes(
+            server_name=target_s3, remote_folder=id_folder, remote_file=candidate_file
         )
 
         # Release the lock
         FaaSr_py.faasr_release(self)
 
         # Abort if current function was not the first to write to the candidate set
-        with open(candidate_temp_path, "r") as updated_candidate_file:
-            first_line = updated_candidate_file.readline().strip()
-            first_line = int(first_line)
+        first_line = int(candidates.split(b"\n", 1)[0].strip())
         if random_number != first_line:
             res_msg = '{"abort_on_multiple_invocations":"not the last trigger invoked - random number does not match"}\n'
             print(res_msg)
             sys.exit(1)
 
+    def elect_winner(self, s3_client, bucket, id_folder):
+        """
+        Elects the invocation that proceeds past a join with one create-if-absent request
+        on {id_folder}/{FunctionInvoke}.winner ({FunctionInvoke}.{rank}.winner for ranked functions)
+
+        returns True if this invocation won, False if another one did,
+        and None if the data store does not implement conditional writes
+
+        Only a 412 means that another invocation won; a put that conflicts with a concurrent one (409)
+        is retried, so the election always has a winner
+        """
+        # Each rank of a ranked function is elected separately
+        winner_path = f"{id_folder}/{get_done_name(self.payload_dict)}.winner"
+        try:
+            conditional_put(s3_client, Bucket=bucket, Key=winner_path, Body=uuid.uuid4().hex, IfNoneMatch="*")
+        except ClientError as e:
+            if is_precondition_failed(e):
+                return False
+            if is_conditional_write_unsupported(e):
+                return None
+            raise
+        return True
+
     def run_user_function(self, imported_functions):
         """
         Runs the user's code that was imported
@@ -293,7 +354,8 @@ class FaaSr:
 
         # Run user function
         try:
-            user_function(**user_args)
+            with trace_span("user_function"):
+                user_function(**user_args)
         except Exception as e:
             nat_err_msg = f'{{"faasr_run_user_function":Errors in the user function: {e}}}'
             err_msg = '{"faasr_run_user_function":"Errors in the user function: ' + str(self.payload_dict["FunctionInvoke"]) + ', check the log for the detail "}\n'
@@ -302,34 +364,42 @@ class FaaSr:
             sys.exit(1)
 
         # At this point, the Action has finished the invocation of the User Function
-        # We flag this by uploading a file with the name FunctionInvoke.done to the S3 logs folder
-        # Check if directory already exists. If not, create one
+        # We flag this by uploading a file with the name FunctionInvoke.done to the done folder of the S3 logs
+        # Ranked functions are marked as done per rank (FunctionInvoke.rank.done)
+        # FunctionInvoke itself is left unchanged, so trigger() can still find the function
         log_folder = f"{faasr_dict['FaaSrLog']}/{faasr_dict['InvocationID']}"
-        log_folder_path = f"/tmp/{log_folder}/{faasr_dict['FunctionInvoke']}/flag/"
-        if not os.path.isdir(log_folder_path):
-            os.makedirs(log_folder_path)
-        curr_action = faasr_dict["FunctionInvoke"]
-        if "Rank" in faasr_dict["FunctionList"][curr_action]:
-            rank_unsplit = faasr_dict["FunctionList"][curr_action]["Rank"]
-            if len(rank_unsplit) != 0:
-                rank = rank_unsplit.split("/")[0]
-                faasr_dict["FunctionInvoke"] = f"{faasr_dict['FunctionInvoke']}.{rank}"
-        file_name = f"{faasr_dict['FunctionInvoke']}.done"
-        with open(f"{log_folder_path}/{file_name}", "w") as f:
-            f.write("True")
-
-        # Put .done file in S3
-        FaaSr_py.faasr_put_file(
-            local_folder=log_folder_path,
-            local_file=file_name,
-            remote_folder=log_folder,
-            remote_file=file_name,
-        )
+        file_name = f"{get_done_name(faasr_dict)}.done"
+
+        # Write buffered log messages before the function is marked as done
+        FaaSr_py.log.flush_log()
+
+        # Put .done marker in the done folder of the logging data store, where successors look for it
+        with trace_span("done_put"):
+            FaaSr_py.faasr_put_bytes(
+                b"True",
+                server_name=self.get_logging_server(),
+                remote_folder=get_done_folder(log_folder),
+                remote_file=file_name,
+            )
 
         
     def trigger(self):
         """
         This method triggers the next actions in the DAG
+
+        All successors (and all ranks of ranked successors) are invoked concurrently,
+        and the result of every invocation is written to the log as one summary entry.
+        Trigger is the last phase of an action, so the trace of the action is written afterwards
+        """
+        try:
+            with trace_span("trigger"):
+                return self.trigger_next_functions()
+        finally:
+            flush_trace()
+
+    def trigger_next_functions(self):
+        """
+        Invokes the next functions of the current action (see trigger)
         """
         # Get a list of the next functions to invoke
         faasr_dict = self.payload_dict
@@ -343,222 +413,78 @@ class FaaSr:
             msg = '{\"faasr_trigger\":\"no triggers for ' + curr_func + '\"}\n'
             print(msg)
             FaaSr_py.faasr_log(msg)
+            FaaSr_py.log.flush_log()
             return
 
-        for next_function in invoke_next:
+        # Ranks of a function with FanInTreeArity report into a fan-in tree,
+        # and only the rank that completes the tree triggers the next functions
+        if not report_to_tree(self):
+            msg = '{\"faasr_trigger\":\"' + curr_func + ' reported to fan-in tree; another rank triggers the next functions\"}\n'
+            print(msg)
+            FaaSr_py.faasr_log(msg)
+            FaaSr_py.log.flush_log()
+            return
+
+        # Build the list of invocations: (function, rank, max rank)
+        # A successor "Func(N)" is expanded into its N ranks
+        targets = []
+        for next_entry in invoke_next:
             # Split function name and rank if needed
-            parts = re.split(r"[()]", next_function)
-            if len(parts) > 1:
-                next_function = parts[0]
-                rank_num = int(parts[1])
-            else:
-                rank_num = 1
+            next_function, rank_num = parse_invoke_next(next_entry)
+            for rank in range(1, rank_num + 1):
+                targets.append((next_function, rank, rank_num))
 
-            # Change FunctionInvoke to the name of the next function
-            faasr_dict['FunctionInvoke'] = next_function
+        # Invoke the next functions concurrently, with at most MaxTriggerConcurrency invocations in flight
+        # Invocations that are not accepted are retried
+        max_workers = int(faasr_dict.get("MaxTriggerConcurrency", DEFAULT_TRIGGER_WORKERS))
+        retries = int(faasr_dict.get("TriggerRetries", DEFAULT_TRIGGER_RETRIES))
 
-            # Determine the name of the faas server for the next function
-            next_server = faasr_dict['FunctionList'][next_function]['FaaSServer']
+        # With PayloadByReference, the payload is stored once in the logging data store
+        # and successors only receive a reference to it
+        envelope = None
+        if faasr_dict.get("PayloadByReference", False):
+            try:
+                envelope = payload_reference.store_payload(self)
+            except Exception as e:
+                err_msg = f'{{"faasr_trigger":"failed to store payload -- error: {e}"}}\n'
+                print(err_msg)
+                FaaSr_py.faasr_log(err_msg)
+                FaaSr_py.log.flush_log()
+                sys.exit(1)
 
-            for rank in range(1, rank_num + 1):
-                # Store rank of next function
-                if(rank_num > 1):
-                    faasr_dict["FunctionList"][next_function]["Rank"] = f"{rank}/{rank_num}"
-                
-                # Abort if the next functions server is not in the server list
-                if next_server not in faasr_dict["ComputeServers"]:
-                    err_msg = '{\"faasr_trigger\":\"invalid server name: ' + next_server + '\"}\n'
-                    print(err_msg)
-                    FaaSr_py.faasr_log(err_msg)
-                    break
-                
-                next_compute_server = faasr_dict["ComputeServers"][next_server]
-
-                # Get faas type of next function's compute server
-                next_server_type = next_compute_server["FaaSType"]
-
-                match(next_server_type):
-                    case "OpenWhisk":
-                        # Get ow credentials
-                        endpoint = next_compute_server["Endpoint"]
-                        api_key = next_compute_server["API.key"]
-                        api_key = api_key.split(":")
-                        
-                        # Check if we should use ssl
-                        if "SSL" not in next_compute_server or len(next_compute_server["SSL"]) == 0:
-                            ssl = True
-                        else:
-                            if next_compute_server["SSL"].lower() != 'false': 
-                                ssl = True
-                            else:
-                                ssl = False
-
-                        # Get the namespace of the OW server
-                        namespace = next_compute_server["Namespace"]
-                        actionname = next_function
-                        
-                        # Append https:// front to endpoint if needed
-                        if not endpoint.startswith("http"):
-                            endpoint = f"https://{endpoint}"
-
-                        # Create url for POST
-                        url = f"{endpoint}/api/v1/namespaces/{namespace}/actions/{actionname}?blocking=false&result=false"
-
-                        # Create headers for POST
-                        headers = {
-                            "accept": "application/json",
-                            "Content-Type": "application/json"
-                        }
-
-                        # Create body for POST
-                        json_payload = json.dumps(self.payload_dict)
-
-                        # Issue POST request
-                        try:
-                            response = requests.post(url=url,
-                                                    auth=(api_key[0], api_key[1]),
-                                                    data=json_payload,
-                                                    headers=headers,
-                                                    verify=ssl)
-                        except Exception as e:
-                            if type(e) == requests.exceptions.ConnectionError:
-                                err_msg = f"{{\"faasr_trigger\": \"OpenWhisk: Error invoking {faasr_dict['FunctionInvoke']} -- connection error\"}}"
-                                print(err_msg)
-                                sys.exit(1)
-                            else:
-                                err_msg = f"{{\"faasr_trigger\": \"OpenWhisk: Error invoking {faasr_dict['FunctionInvoke']} -- see logs\"}}"
-                                nat_err_msg = err_msg = f"{{\"faasr_trigger\": \"OpenWhisk: Error invoking {faasr_dict['FunctionInvoke']} -- error: {e}\"}}"
-                                print(err_msg)
-                                FaaSr_py.faasr_log(nat_err_msg)
-                                sys.exit(1)
-                        
-                        if response.status_code == 200 or response.status_code == 202:
-                            succ_msg = f"{{\"faasr_trigger\":\"OpenWhisk: Succesfully invoked {faasr_dict['FunctionInvoke']}\"}}"
-                            print(succ_msg)
-                            FaaSr_py.faasr_log(succ_msg)
-                        else:
-                            err_msg = f"{{\"faasr_trigger\":\"OpenWhisk: Error invoking {faasr_dict['FunctionInvoke']} -- status code: {response.status_code}\"}}"
-                            print(err_msg)
-                            FaaSr_py.faasr_log(err_msg)
-                        break
-
-                    case "Lambda":
-                        # Create client for invoking lambda function
-                        lambda_client = boto3.client(
-                            "lambda",
-                            aws_access_key_id=next_compute_server["AccessKey"],
-                            aws_secret_access_key=next_compute_server["SecretKey"],
-                            region_name=next_compute_server["Region"],
-                            )
-
-                        # Invoke lambda function
-                        try:
-                            response = lambda_client.invoke(
-                                FunctionName = next_function,
-                                Payload = json.dumps(self.payload_dict),
-                                )
-                        except Exception as e:   
-                                err_msg = f"{{\"faasr_trigger\": \"Error invoking function: {self.payload_dict['FunctionInvoke']} -- {e}\"}}\n"
-                                print(err_msg)
-                                FaaSr_py.faasr_log(err_msg)     
-                                continue                       
-                        
-                        if 'StatusCode' in response and str(response['StatusCode'])[0] == '2':
-                            succ_msg = f"{{\"faasr_trigger\": \"Successfully invoked: {self.payload_dict['FunctionInvoke']}\"}}\n"
-                            print(succ_msg)
-                            FaaSr_py.faasr_log(succ_msg)
-                        else:
-                            try:
-                                err_msg = f"{{\"faasr_trigger\": \"Error invoking function: {self.payload_dict['FunctionInvoke']} -- error: {response['FunctionError']}\"}}\n"
-                                print(err_msg)
-                                FaaSr_py.faasr_log(err_msg)
-                            except Exception:
-                                err_msg = f"{{\"faasr_trigger\": \"Error invoking function: {self.payload_dict['FunctionInvoke']} -- no response from AWS\"}}\n"
-                                print(err_msg)
-                                FaaSr_py.faasr_log(err_msg)
-
-                        break
-                    case "GitHubActions":
-                        # Get env values for GH actions
-                        pat = next_compute_server["Token"]
-                        username = next_compute_server["UserName"]
-                        reponame = next_compute_server["ActionRepoName"]
-                        repo = f"{username}/{reponame}"
-                        if not next_function.endswith('.ml') and not next_function.endswith('.yaml'):
-                            workflow_file = f"{next_function}.yml"
-                        else:
-                            workflow_file = next_function
-                        git_ref = next_compute_server["Branch"]
-
-                        # Create copy of faasr payload
-                        faasr_git = copy.deepcopy(faasr_dict)
-
-                        # Hide credentials for compute servers before sending
-                        for faas_js in faasr_git["ComputeServers"]:
-                            match faasr_git["ComputeServers"][faas_js]["FaaSType"]:
-                                case "GitHubActions":
-                                    faasr_git["ComputeServers"][faas_js]["Token"] = f"{faas_js}_TOKEN"
-                                    break
-                                case "Lambda":
-                                    faasr_git["ComputeServers"][faas_js]["AccessKey"] = f"{faas_js}_ACCESS_KEY"
-                                    faasr_git["ComputeServers"][faas_js]["SecretKey"] = f"{faas_js}_SECRET_KEY"
-                                    break
-                                case "OpenWhisk":
-                                    faasr_git["ComputeServers"][faas_js]["API.key"] = f"{faas_js}_API_KEY"
-                                    break
-
-                        # Hide credentials for data stores before sending
-                        for data_js in faasr_git["DataStores"]:
-                            faasr_git["DataStores"][data_js]["AccessKey"] = f"{data_js}_ACCESS_KEY"
-                            faasr_git["DataStores"][data_js]["SecretKey"] = f"{data_js}_SECRET_KEY"
-
-                        # Create payload input
-                        json_payload = json.dumps(faasr_git, indent=4)
-                        inputs = {"PAYLOAD": json_payload}
-
-                        # Delete copy of faar payload
-                        del faasr_git
-
-                        # Create url for GitHub API
-                        url = f"https://api.github.com/repos/{repo}/actions/workflows/{workflow_file}/dispatches"
-
-                        # Create body for POST request
-                        body = {"ref": git_ref, "inputs": inputs}
-
-                        # Create headers for POST request
-                        post_headers = {
-                            "Authorization": f"token {pat}",
-                            "Accept": "application/vnd.github.v3+json",
-                            "X-GitHub-Api-Version": "2022-11-28"}
-
-                        # Issue POST request
-                        response = requests.post(
-                            url = url,
-                            json = body,
-                            headers = post_headers
-                        )
-
-                        # Log response
-                        if response.status_code == 204:
-                            succ_msg = f"{{faasr_trigger: GitHub Action: Successfully invoked: {faasr_dict['FunctionInvoke']}}}\n"
-                            print(succ_msg)
-                            FaaSr_py.faasr_log(succ_msg)
-                        elif response.status_code == 401:
-                            err_msg = "{faasr_trigger: GitHub Action: Authentication failed, check the credentials}\n"
-                            print(err_msg)
-                            FaaSr_py.faasr_log(err_msg)
-                        elif response.status_code == 404:
-                            err_msg = f"{{faasr_trigger: GitHub Action: Cannot find the destination, check the repo name: {repo} and workflow name: {workflow_file}}}\n"
-                            print(err_msg)
-                            FaaSr_py.faasr_log(err_msg)
-                        elif response.status_code == 422:
-                            err_msg = f"{{faasr_trigger: GitHub Action: Cannot find the destination, check the ref: {faasr_dict["FunctionInvoke"]}\n}}"
-                            print(err_msg)
-                            FaaSr_py.faasr_log(err_msg)
-                        else:
-                            err_msg = "{faasr_trigger: GitHub Action: unknown error happens when invoke next function}\n"
-                            print(err_msg)
-                            FaaSr_py.faasr_log(err_msg)
+        results = faasr_trigger.dispatch(faasr_dict, targets, max_workers, retries, envelope)
+
+        # Log the result of every invocation as one entry
+        succeeded = sum(1 for result in results if result.Success)
+        for result in results:
+            if not result.Success:
+                print(f'{{"faasr_trigger":"{result.Message}"}}\n')
+        print(f'{{"faasr_trigger":"invoked {succeeded} of {len(results)} functions"}}\n')
+        summary = {
+            "faasr_trigger": {
+                "invoked": succeeded,
+                "failed": len(results) - succeeded,
+                "results": [result._asdict() for result in results],
+            }
+        }
+        FaaSr_py.faasr_log(json.dumps(summary))
+
+        # Abort if any function or rank was not accepted, so the workflow does not silently stall
+        failed = [result for result in results if not result.Success]
+        if len(failed) != 0:
+            failed_names = ", ".join(
+                result.Function if result.Rank is None else f"{result.Function}({result.Rank})" for result in failed
+            )
+            err_msg = f'{{"faasr_trigger":"{len(failed)} of {len(results)} invocations were not accepted: {failed_names}"}}\n'
+            print(err_msg)
+            FaaSr_py.faasr_log(err_msg)
+            FaaSr_py.log.flush_log()
+            sys.exit(1)
+
+        # Write the trigger results to the log
+        FaaSr_py.log.flush_log()
+
+        return results
 
     def get_user_function_args(self):
         """
@@ -2,30 +2,50 @@ import json
 import uuid
 from .graph_functions import *
 from .faasr_payload import FaaSr
+from .payload_reference import is_envelope, resolve_payload
+from .completion import expected_done_names
 from . import global_faasr as faasr_env
+from .tracing import tracer, trace_span
 
 
 def faasr_start(faasr_payload):
+    # Reset the state of the previous invocation in this container and start the trace of this action;
+    # every phase below is recorded as a span
+    faasr_env.runtime.begin_invocation()
+
+    # If the action was invoked with a reference to a stored payload, fetch the full payload
+    # (warm containers reuse the copy they already resolved)
+    if is_envelope(faasr_payload):
+        with trace_span("resolve_payload"):
+            faasr_payload = resolve_payload(faasr_payload)
+
     # Initialize a payload object 
     # (Note: this object is a reference to the global variable in global_faasr)
-    faasr_obj = faasr_env.initialize_faasr(faasr_payload)
+    with trace_span("validate_json"):
+        faasr_obj = faasr_env.initialize_faasr(faasr_payload)
+    tracer.set_action(faasr_obj)
 
     # Verifies that the faasr payload is a DAG, meaning that there is no cycles
     # If the payload is a DAG, then this function returns a predecessor list for the workflow
     # If the payload is not a DAG, then the action aborts
-    pre = check_dag(faasr_obj.get_payload_dict())
+    with trace_span("check_dag"):
+        pre = check_dag(faasr_obj.get_payload_dict(), faasr_obj.get_dag_analysis())
     
     # Verfies the validity of S3 data stores, checvking the server status and ensuring that the specified bucket exists
     # If any of the S3 endpoints are invalid or any data store server are unreachable, the action aborts
-    faasr_obj.s3_check()
+    with trace_span("s3_check"):
+        faasr_obj.s3_check()
 
     # Initialize log if this is the first action in the workflow
     if(len(pre) == 0):
-        faasr_obj.init_log_folder()
+        with trace_span("init_log_folder"):
+            faasr_obj.init_log_folder()
 
     # If there are more than 1 predecessor, then only the final action invoked will sucessfully run
+    # A single ranked predecessor counts as one predecessor per rank
     # This function validates that the current action is the last invocation; otherwise, it aborts
-    if (len(pre) > 1):
-        faasr_obj.abort_on_multiple_invocations(pre)
+    if (len(expected_done_names(faasr_obj["FunctionList"], pre, faasr_obj.get_dag_analysis())) > 1):
+        with trace_span("abort_on_multiple_invocations"):
+            faasr_obj.abort_on_multiple_invocations(pre)
 
     return faasr_obj
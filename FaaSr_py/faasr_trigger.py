@@ -0,0 +1,422 @@
+import copy
+import json
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from .global_faasr import runtime
+
+# Default number of invocations sent at the same time
+# Can be overridden with the "MaxTriggerConcurrency" payload field
+DEFAULT_TRIGGER_WORKERS = 32
+
+# Number of times invocations that failed transiently are retried
+DEFAULT_TRIGGER_RETRIES = 2
+
+# Connect and read timeouts in seconds of OpenWhisk and GitHub Actions invocation requests
+TRIGGER_TIMEOUT = (5, 30)
+
+# HTTP status codes of invocations that may succeed when retried (throttling and server errors)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Prefix of the sentinel that stands in for the rank in a serialized payload, so the payload of a function
+# is serialized once and every rank only splices its own rank in (a unique id is appended to every sentinel)
+RANK_PLACEHOLDER = "__FAASR_RANK__"
+
+# Result of invoking one successor
+# Rank is "rank/max rank" for ranked functions and None otherwise
+TriggerResult = namedtuple("TriggerResult", ["Function", "Rank", "Success", "Message"])
+
+# Called with (function, serialized payload) for functions on "Local" compute servers
+# Set by the local runner, which queues the invocation and returns (success, message)
+local_invoker = None
+
+# Pooled HTTP session and Lambda clients, shared by every trigger in this process
+http_session = None
+lambda_clients = {}
+client_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Returns the pooled HTTP session used for OpenWhisk and GitHub Actions invocations
+    """
+    global http_session
+    if http_session is None:
+        with client_lock:
+            if http_session is None:
+                # requests is imported on first use, so actions that do not trigger OpenWhisk or GitHub never load it
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=DEFAULT_TRIGGER_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                http_session = session
+    return http_session
+
+
+def get_lambda_client(compute_server):
+    """
+    Returns the cached Lambda client for a compute server
+    """
+    client_key = (compute_server["AccessKey"], compute_server["SecretKey"], compute_server["Region"])
+    lambda_client = lambda_clients.get(client_key)
+    runtime.record("LambdaClients", lambda_client is not None)
+    if lambda_client is None:
+        with client_lock:
+            lambda_client = lambda_clients.get(client_key)
+            if lambda_client is None:
+                import boto3
+                lambda_client = boto3.client(
+                    "lambda",
+                    aws_access_key_id=compute_server["AccessKey"],
+                    aws_secret_access_key=compute_server["SecretKey"],
+                    region_name=compute_server["Region"],
+                )
+                lambda_clients[client_key] = lambda_client
+    return lambda_client
+
+
+def dispatch(payload_dict, targets, max_workers=DEFAULT_TRIGGER_WORKERS, retries=DEFAULT_TRIGGER_RETRIES, envelope=None):
+    """
+    Invokes all targets concurrently and retries the invocations that failed transiently
+
+    Only failures where the invocation was certainly not accepted are retried: connections that could not
+    be established, throttling (429) and server errors (5xx). Other failures (e.g. bad credentials, or
+    a connection lost after the request was sent) are not retried, so a successor never runs twice
+
+    parameters:
+        payload_dict(dict): payload of the current action (it is not modified)
+        targets(list): (function, rank, max rank) tuples to invoke
+        max_workers(int): maximum number of invocations in flight
+        retries(int): number of times transient failures are retried
+        envelope(dict): if given, successors receive this payload reference instead of the payload
+
+    returns a list of TriggerResult in the order of targets
+    """
+    # Serialize the payload of each next function once; ranks only differ in the Rank field
+    requests_by_function = {}
+    for function, rank, max_rank in targets:
+        if (function, max_rank > 1) not in requests_by_function:
+            requests_by_function[(function, max_rank > 1)] = prepare_request(payload_dict, function, max_rank, envelope)
+
+    def invoke(target):
+        function, rank, max_rank = target
+        label = rank_label(rank, max_rank)
+        try:
+            compute_server, payload_parts, error = requests_by_function[(function, max_rank > 1)]
+            if error is not None:
+                return TriggerResult(function, label, False, error), False
+            # Ranked payloads are split around the rank, the others are a single part
+            payload_json = json.dumps(label).join(payload_parts)
+            success, message, retryable = invoke_function(compute_server, function, payload_json)
+            return TriggerResult(function, label, success, message), retryable
+        except Exception as e:
+            return TriggerResult(function, label, False, f"Error invoking {function} -- error: {e}"), False
+
+    results = [None] * len(targets)
+    retryable = [False] * len(targets)
+    pending = list(range(len(targets)))
+    attempt = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+        while True:
+            for i, (result, can_retry) in zip(pending, executor.map(invoke, [targets[i] for i in pending])):
+                results[i] = result
+                retryable[i] = can_retry
+
+            # Verify that every invocation was accepted, retrying the ones that failed transiently
+            pending = [i for i in pending if not results[i].Success and retryable[i]]
+            if len(pending) == 0 or attempt >= retries:
+                break
+            attempt += 1
+            time.sleep(0.5 * 2 ** attempt)
+
+    return results
+
+
+def rank_label(rank, max_rank):
+    """
+    Returns the "rank/max rank" label of a ranked invocation, or None
+    """
+    if max_rank > 1:
+        return f"{rank}/{max_rank}"
+    return None
+
+
+def build_payload(payload_dict, function, rank_field=None):
+    """
+    Returns the payload sent to the next function
+
+    The payload shares everything with payload_dict except the top level, the FunctionList
+    and the entry of the next function, so payload_dict itself is never modified
+    """
+    next_payload = dict(payload_dict)
+    next_payload["FunctionInvoke"] = function
+    if rank_field is not None:
+        next_payload["FunctionList"] = dict(payload_dict["FunctionList"])
+        next_payload["FunctionList"][function] = dict(payload_dict["FunctionList"][function], Rank=rank_field)
+    return next_payload
+
+
+def prepare_request(payload_dict, function, max_rank, envelope=None):
+    """
+    Returns (compute server, serialized payload parts, error) for invoking function
+
+    For ranked functions the payload is serialized with a unique sentinel as its rank and split at
+    the sentinel into (before, after), so each rank is spliced in at that offset and user values that look
+    like a rank placeholder are left as they are; other payloads are returned as a single part.
+    If envelope is given, it is sent instead of the payload, with FunctionInvoke and Rank set
+    """
+    # Determine the name of the faas server for the next function
+    next_server = payload_dict["FunctionList"][function]["FaaSServer"]
+
+    # Abort if the next functions server is not in the server list
+    if next_server not in payload_dict["ComputeServers"]:
+        return None, None, f"invalid server name: {next_server}"
+
+    next_compute_server = payload_dict["ComputeServers"][next_server]
+    rank_field = f"{RANK_PLACEHOLDER}{uuid.uuid4().hex}" if max_rank > 1 else None
+    if envelope is not None:
+        next_payload = dict(envelope, FunctionInvoke=function)
+        if rank_field is not None:
+            next_payload["Rank"] = rank_field
+    else:
+        next_payload = build_payload(payload_dict, function, rank_field)
+
+    # GitHub Actions receives the payload with the credentials hidden
+    # (compact, since workflow dispatch inputs are limited in size)
+    if next_compute_server["FaaSType"] == "GitHubActions":
+        payload_json = json.dumps(mask_credentials(next_payload), separators=(",", ":"))
+    else:
+        payload_json = json.dumps(next_payload)
+
+    if rank_field is None:
+        return next_compute_server, [payload_json], None
+    before, _, after = payload_json.partition(json.dumps(rank_field))
+    return next_compute_server, [before, after], None
+
+
+def invoke_function(compute_server, function, payload_json):
+    """
+    Invokes function on its compute server
+
+    returns (success, message, retryable), where retryable is True if the invocation
+    certainly was not accepted and may succeed when retried
+    """
+    # Get faas type of next function's compute server
+    match compute_server["FaaSType"]:
+        case "OpenWhisk":
+            return invoke_openwhisk(compute_server, function, payload_json)
+        case "Lambda":
+            return invoke_lambda(compute_server, function, payload_json)
+        case "GitHubActions":
+            return invoke_github_actions(compute_server, function, payload_json)
+        case "Local":
+            return invoke_local(function, payload_json)
+        case faas_type:
+            return False, f"unsupported FaaSType {faas_type} for {function}", False
+
+
+def invoke_openwhisk(compute_server, function, payload_json):
+    """
+    Invokes an OpenWhisk action without waiting for it to finish
+
+    returns (success, message, retryable)
+    """
+    # Get ow credentials
+    endpoint = compute_server["Endpoint"]
+    api_key = compute_server["API.key"].split(":")
+
+    # Check if we should use ssl
+    if "SSL" not in compute_server or len(compute_server["SSL"]) == 0:
+        ssl = True
+    else:
+        ssl = compute_server["SSL"].lower() != 'false'
+
+    # Get the namespace of the OW server
+    namespace = compute_server["Namespace"]
+
+    # Append https:// front to endpoint if needed
+    if not endpoint.startswith("http"):
+        endpoint = f"https://{endpoint}"
+
+    # Create url for POST
+    url = f"{endpoint}/api/v1/namespaces/{namespace}/actions/{function}?blocking=false&result=false"
+
+    # Create headers for POST
+    headers = {
+        "accept": "application/json",
+        "Content-Type": "application/json"
+    }
+
+    # Issue POST request
+    session = get_http_session()
+    import requests
+    try:
+        response = session.post(
+            url=url,
+            auth=(api_key[0], api_key[1]),
+            data=payload_json,
+            headers=headers,
+            verify=ssl,
+            timeout=TRIGGER_TIMEOUT,
+        )
+    except requests.exceptions.ConnectionError as e:
+        return False, f"OpenWhisk: Error invoking {function} -- connection error: {e}", request_not_sent(e)
+    except Exception as e:
+        return False, f"OpenWhisk: Error invoking {function} -- error: {e}", False
+
+    if response.status_code == 200 or response.status_code == 202:
+        return True, f"OpenWhisk: Succesfully invoked {function}", False
+    return (
+        False,
+        f"OpenWhisk: Error invoking {function} -- status code: {response.status_code}",
+        response.status_code in RETRYABLE_STATUS_CODES,
+    )
+
+
+def invoke_lambda(compute_server, function, payload_json):
+    """
+    Invokes a Lambda function asynchronously (InvocationType Event)
+
+    returns (success, message, retryable)
+    """
+    from botocore.exceptions import ClientError, ConnectTimeoutError, EndpointConnectionError
+    lambda_client = get_lambda_client(compute_server)
+
+    # Invoke lambda function without waiting for it to finish
+    try:
+        response = lambda_client.invoke(
+            FunctionName=function,
+            InvocationType="Event",
+            Payload=payload_json,
+        )
+    except (ConnectTimeoutError, EndpointConnectionError) as e:
+        # The connection could not be established, so the request was not sent
+        return False, f"Lambda: Error invoking function: {function} -- {e}", True
+    except ClientError as e:
+        status_code = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return False, f"Lambda: Error invoking function: {function} -- {e}", status_code in RETRYABLE_STATUS_CODES
+    except Exception as e:
+        return False, f"Lambda: Error invoking function: {function} -- {e}", False
+
+    if 'StatusCode' in response and str(response['StatusCode'])[0] == '2':
+        return True, f"Lambda: Successfully invoked: {function}", False
+    if 'FunctionError' in response:
+        return False, f"Lambda: Error invoking function: {function} -- error: {response['FunctionError']}", False
+    return False, f"Lambda: Error invoking function: {function} -- no response from AWS", False
+
+
+def invoke_local(function, payload_json):
+    """
+    Hands an invocation to the local runner of this process
+
+    returns (success, message, retryable)
+    """
+    if local_invoker is None:
+        return False, f"Local: Error invoking {function} -- no local runner is active", False
+    success, message = local_invoker(function, payload_json)
+    return success, message, False
+
+
+def mask_credentials(payload):
+    """
+    Returns a copy of the payload where the credentials of compute servers and data stores
+    are replaced by the names of the secrets that hold them
+    """
+    masked = dict(payload)
+    masked["ComputeServers"] = copy.deepcopy(payload["ComputeServers"])
+    masked["DataStores"] = copy.deepcopy(payload["DataStores"])
+
+    # Hide credentials for compute servers before sending
+    for faas_js, faas_server in masked["ComputeServers"].items():
+        match faas_server["FaaSType"]:
+            case "GitHubActions":
+                faas_server["Token"] = f"{faas_js}_TOKEN"
+            case "Lambda":
+                faas_server["AccessKey"] = f"{faas_js}_ACCESS_KEY"
+                faas_server["SecretKey"] = f"{faas_js}_SECRET_KEY"
+            case "OpenWhisk":
+                faas_server["API.key"] = f"{faas_js}_API_KEY"
+
+    # Hide credentials for data stores before sending
+    for data_js, data_store in masked["DataStores"].items():
+        data_store["AccessKey"] = f"{data_js}_ACCESS_KEY"
+        data_store["SecretKey"] = f"{data_js}_SECRET_KEY"
+
+    return masked
+
+
+def invoke_github_actions(compute_server, function, payload_json):
+    """
+    Dispatches a GitHub Actions workflow
+
+    returns (success, message, retryable)
+    """
+    # Get env values for GH actions
+    pat = compute_server["Token"]
+    username = compute_server["UserName"]
+    reponame = compute_server["ActionRepoName"]
+    repo = f"{username}/{reponame}"
+    if not function.endswith('.ml') and not function.endswith('.yaml'):
+        workflow_file = f"{function}.yml"
+    else:
+        workflow_file = function
+    git_ref = compute_server["Branch"]
+
+    # Create payload input (credentials are already hidden)
+    inputs = {"PAYLOAD": payload_json}
+
+    # Create url for GitHub API
+    url = f"https://api.github.com/repos/{repo}/actions/workflows/{workflow_file}/dispatches"
+
+    # Create body for POST request
+    body = {"ref": git_ref, "inputs": inputs}
+
+    # Create headers for POST request
+    post_headers = {
+        "Authorization": f"token {pat}",
+        "Accept": "application/vnd.github.v3+json",
+        "X-GitHub-Api-Version": "2022-11-28"}
+
+    # Issue POST request
+    session = get_http_session()
+    import requests
+    try:
+        response = session.post(url=url, json=body, headers=post_headers, timeout=TRIGGER_TIMEOUT)
+    except requests.exceptions.ConnectionError as e:
+        return False, f"GitHub Action: Error invoking {function} -- connection error: {e}", request_not_sent(e)
+    except Exception as e:
+        return False, f"GitHub Action: Error invoking {function} -- error: {e}", False
+
+    # Check response
+    if response.status_code == 204:
+        return True, f"GitHub Action: Successfully invoked: {function}", False
+    elif response.status_code == 401:
+        return False, "GitHub Action: Authentication failed, check the credentials", False
+    elif response.status_code == 404:
+        return False, f"GitHub Action: Cannot find the destination, check the repo name: {repo} and workflow name: {workflow_file}", False
+    elif response.status_code == 422:
+        return False, f"GitHub Action: Cannot find the destination, check the ref: {function}", False
+    else:
+        return (
+            False,
+            f"GitHub Action: unknown error happens when invoke next function -- status code: {response.status_code}",
+            response.status_code in RETRYABLE_STATUS_CODES,
+        )
+
+
+def request_not_sent(error):
+    """
+    Returns True if a requests ConnectionError happened before the request was sent
+    (the connection was refused, the host was not found, or connecting timed out)
+    """
+    import requests
+    from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # requests wraps the urllib3 error, whose reason tells at which point the request failed
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
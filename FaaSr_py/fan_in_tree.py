@@ -0,0 +1,107 @@
+import sys
+from botocore.exceptions import ClientError
+from .s3_helper_functions import is_precondition_failed, is_conditional_write_unsupported, conditional_put
+
+# Sub-folder of {FaaSrLog}/{InvocationID} holding the markers of the fan-in trees
+TREE_FOLDER = "tree"
+
+
+def tree_marker_key(id_folder, func, level, index):
+    """
+    Returns the key of the marker of node index at level of the fan-in tree of func
+
+    Indexes are zero-padded, so the markers of a level are listed in index order
+    """
+    return f"{id_folder}/{TREE_FOLDER}/{func}/{level}/{index:08d}"
+
+
+def report_to_tree(faasr):
+    """
+    Reports the completion of the current rank to the fan-in tree of its function
+
+    Ranks of a function with "FanInTreeArity": k report into groups of k ranks.
+    The rank that completes a group reports the group to the next level, and so on,
+    until one rank completes the root. Only that rank triggers the next functions,
+    so a stage of N ranks starts its successors once instead of N times
+
+    returns True if the current action should trigger the next functions
+    """
+    payload_dict = faasr.get_payload_dict()
+    func = payload_dict["FunctionInvoke"]
+    func_info = payload_dict["FunctionList"][func]
+
+    # Only ranked functions with a tree arity take part in tree fan-in
+    arity = int(func_info.get("FanInTreeArity", 0))
+    rank_unsplit = func_info.get("Rank", "")
+    if arity == 0 or len(rank_unsplit) == 0:
+        return True
+    if arity < 2:
+        err_msg = f'{{"faasr_fan_in_tree":"FanInTreeArity of {func} must be at least 2"}}\n'
+        print(err_msg)
+        sys.exit(1)
+    rank, max_rank = (int(part) for part in rank_unsplit.split("/"))
+    if max_rank < 2:
+        return True
+
+    logging_server = faasr.get_logging_server()
+    bucket = payload_dict["DataStores"][logging_server]["Bucket"]
+    s3_client = faasr.get_s3_client(logging_server)
+    id_folder = f"{payload_dict['FaaSrLog']}/{payload_dict['InvocationID']}"
+
+    try:
+        return climb_tree(s3_client, bucket, id_folder, func, rank - 1, max_rank, arity)
+    except ClientError as e:
+        if not is_conditional_write_unsupported(e):
+            raise
+        # Without conditional writes every rank triggers, and the join elects the winner
+        return True
+
+
+def climb_tree(s3_client, bucket, id_folder, func, index, width, arity):
+    """
+    Marks node index of level 0 as complete and climbs the tree while this action completes groups
+
+    Two actions may both see their group complete; the conditional put of the parent marker
+    elects one of them to continue. The last action to mark a group always sees it complete,
+    so every group is reported exactly once
+
+    returns True if this action completed the root
+    """
+    level = 0
+    s3_client.put_object(Bucket=bucket, Key=tree_marker_key(id_folder, func, level, index), Body=b"")
+    while width > 1:
+        group = index // arity
+        first = group * arity
+        size = min(arity, width - first)
+        if not group_complete(s3_client, bucket, id_folder, func, level, first, size):
+            return False
+
+        # Elect the action that reports the group to the next level
+        try:
+            conditional_put(
+                s3_client, Bucket=bucket, Key=tree_marker_key(id_folder, func, level + 1, group),
+                Body=b"", IfNoneMatch="*",
+            )
+        except ClientError as e:
+            if is_precondition_failed(e):
+                return False
+            raise
+
+        index = group
+        width = (width + arity - 1) // arity
+        level += 1
+    return True
+
+
+def group_complete(s3_client, bucket, id_folder, func, level, first, size):
+    """
+    Returns True if the markers of nodes first ... first + size - 1 of level all exist
+
+    The group is checked with one listing that starts right before its first marker
+    """
+    list_args = {"Bucket": bucket, "Prefix": f"{id_folder}/{TREE_FOLDER}/{func}/{level}/", "MaxKeys": size}
+    if first > 0:
+        list_args["StartAfter"] = tree_marker_key(id_folder, func, level, first - 1)
+    response = s3_client.list_objects_v2(**list_args)
+    keys = {content["Key"] for content in response.get("Contents", [])}
+    return all(tree_marker_key(id_folder, func, level, index) in keys for index in range(first, first + size))
@@ -0,0 +1,195 @@
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from .global_faasr import runtime
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (Windows) cached files are hard-linked or copied
+    fcntl = None
+
+# Folder holding the cached objects; it persists across warm invocations of the same container
+FILE_CACHE_FOLDER = "/tmp/faasr_cache"
+
+# Default disk budget of the cache in bytes (/tmp is RAM-backed on some platforms)
+# Can be overridden with the "FileCacheBytes" data store field
+DEFAULT_FILE_CACHE_BYTES = 256 * 1024 * 1024
+
+# Age in seconds after which a temporary download left by a crashed action is removed
+STALE_DOWNLOAD_AGE = 3600
+
+# ioctl asking the file system for a copy-on-write clone of a file (Linux FICLONE)
+FICLONE = 0x40049409
+
+# How cached files are placed at the requested local path, selected with the "FileCacheLink" data store field
+#   copy (default): copy-on-write clone, else copy; the file handed to the user is its own writable file
+#   link: copy-on-write clone, else hard link to the read-only cached copy, else copy. Saves the copy, but a
+#         function that modifies its input in place fails, or (running as root) corrupts the cached copy
+FILE_CACHE_LINK = "link"
+FILE_CACHE_COPY = "copy"
+
+
+def cache_file_name(target_s3, etag, size):
+    """
+    Returns the name of the cached copy of an object with etag and size in a data store
+
+    Cached objects are addressed by their content (ETag and size) rather than their key,
+    so objects with the same content under different keys share one copy
+    """
+    identity = f"{target_s3['Endpoint']}\n{target_s3['Bucket']}\n{etag}\n{size}"
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def get_cached_file(s3_client, target_s3, key, local_path, transfer_config, cache_bytes=None, link_mode=None):
+    """
+    Downloads an object to local_path through the local file cache
+
+    The object is revalidated with a HEAD request: if a copy with the same ETag is cached,
+    it is linked to local_path without downloading it. Otherwise the object is downloaded into
+    the cache, which evicts the least recently used copies to stay within cache_bytes
+
+    returns True if the object was served from the cache
+    """
+    if cache_bytes is None:
+        cache_bytes = int(target_s3.get("FileCacheBytes", DEFAULT_FILE_CACHE_BYTES))
+    if link_mode is None:
+        link_mode = target_s3.get("FileCacheLink", FILE_CACHE_COPY)
+
+    head = s3_client.head_object(Bucket=target_s3["Bucket"], Key=key)
+    etag, size = head["ETag"], head["ContentLength"]
+    os.makedirs(FILE_CACHE_FOLDER, exist_ok=True)
+    cache_path = os.path.join(FILE_CACHE_FOLDER, cache_file_name(target_s3, etag, size))
+
+    # Serve the cached copy; another process may have evicted it since the HEAD request
+    if os.path.exists(cache_path):
+        try:
+            os.utime(cache_path)
+            link_file(cache_path, local_path, link_mode)
+            runtime.record("FileCache", True)
+            return True
+        except FileNotFoundError:
+            pass
+    runtime.record("FileCache", False)
+
+    # Objects larger than the whole budget are not cached
+    if size > cache_bytes:
+        s3_client.download_file(Bucket=target_s3["Bucket"], Key=key, Filename=local_path, Config=transfer_config)
+        return False
+
+    # Download next to the cache, so the copy is moved into it atomically
+    temp_path = os.path.join(FILE_CACHE_FOLDER, f".tmp-{uuid.uuid4().hex}")
+    try:
+        extra_args = {"VersionId": head["VersionId"]} if head.get("VersionId") else None
+        s3_client.download_file(
+            Bucket=target_s3["Bucket"], Key=key, Filename=temp_path, ExtraArgs=extra_args, Config=transfer_config
+        )
+        # Without versioning, the object may have been replaced during the download;
+        # only cache the copy if its ETag still matches
+        if extra_args is None and s3_client.head_object(Bucket=target_s3["Bucket"], Key=key)["ETag"] != etag:
+            os.replace(temp_path, local_path)
+            return False
+
+        # Cached copies are read-only, since hard links share them with the files handed to the user
+        os.chmod(temp_path, 0o444)
+        os.replace(temp_path, cache_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    evict_files(cache_bytes, keep=cache_path)
+    link_file(cache_path, local_path, link_mode)
+    return False
+
+
+def link_file(cache_path, local_path, link_mode=FILE_CACHE_COPY):
+    """
+    Places the cached file at local_path, replacing any existing file
+
+    Tries a copy-on-write clone (reflink) first, then (in "link" mode) a hard link sharing the
+    read-only cached copy, then a plain copy, e.g. when the cache and local_path are on different file systems
+    """
+    temp_path = f"{local_path}.tmp-{uuid.uuid4().hex}"
+    try:
+        if clone_file(cache_path, temp_path):
+            pass
+        elif link_mode == FILE_CACHE_LINK:
+            try:
+                os.link(cache_path, temp_path)
+            except OSError as e:
+                if isinstance(e, FileNotFoundError) and not os.path.exists(cache_path):
+                    raise
+                shutil.copyfile(cache_path, temp_path)
+        else:
+            # copyfile does not copy the permissions, so the copy is writable unlike the cached copy
+            shutil.copyfile(cache_path, temp_path)
+        os.replace(temp_path, local_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def clone_file(source_path, target_path):
+    """
+    Creates target_path as a copy-on-write clone of source_path
+
+    returns False if the file system does not support clones
+    """
+    if fcntl is None:
+        return False
+    with open(source_path, "rb") as source:
+        with open(target_path, "wb") as target:
+            try:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+                return True
+            except OSError:
+                pass
+    os.remove(target_path)
+    return False
+
+
+def evict_files(cache_bytes, keep=None):
+    """
+    Removes the least recently used cached files until the cache fits in cache_bytes
+
+    Hits refresh the modification time of a cached file, so it orders the files by last use.
+    Files still linked to a local path keep using disk space until that path is removed
+    """
+    now = time.time()
+    entries = []
+    total = 0
+    with os.scandir(FILE_CACHE_FOLDER) as scan:
+        for entry in scan:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.startswith(".tmp-"):
+                if now - stat.st_mtime > STALE_DOWNLOAD_AGE:
+                    remove_file(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    for _, size, path in sorted(entries):
+        if total <= cache_bytes:
+            break
+        if path != keep:
+            remove_file(path)
+            total -= size
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def clear_file_cache():
+    """
+    Removes every cached file
+    """
+    shutil.rmtree(FILE_CACHE_FOLDER, ignore_errors=True)
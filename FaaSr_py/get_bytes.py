@@ -0,0 +1,81 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from .remote_file import get_remote_target
+from .s3_helper_functions import get_transfer_config, is_precondition_failed
+
+
+def faasr_get_bytes(remote_file, server_name="", remote_folder=".", buffer=None,
+                    multipart_threshold=None, multipart_chunksize=None, max_concurrency=None):
+    """
+    This function downloads a file from S3 into memory, without writing it to /tmp
+
+    Objects up to multipart_threshold bytes are read with a single GET. Larger objects are read
+    with max_concurrency parallel ranged GETs of multipart_chunksize bytes (defaults come from the data store)
+
+    parameters:
+        buffer: writable buffer-protocol object (e.g. a bytearray, memoryview or numpy array)
+                to download into; it must be at least as large as the file
+
+    returns the content of the file (bytes if it was read with one GET, otherwise the bytearray the parts
+    were read into, to avoid copying it), or the number of bytes written if buffer is given
+    """
+    s3_client, target_s3, key = get_remote_target(remote_file, server_name, remote_folder, "faasr_get_bytes")
+    transfer_config = get_transfer_config(target_s3, multipart_threshold, multipart_chunksize, max_concurrency)
+    bucket = target_s3["Bucket"]
+
+    # The first GET reads up to multipart_threshold bytes and tells the size of the object
+    try:
+        response = s3_client.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes=0-{transfer_config.multipart_threshold - 1}"
+        )
+    except ClientError as e:
+        # Ranges of empty objects are not satisfiable
+        if e.response.get("Error", {}).get("Code") != "InvalidRange":
+            raise
+        return b"" if buffer is None else 0
+    first_part = response["Body"].read()
+    if "ContentRange" in response:
+        size = int(response["ContentRange"].rsplit("/", 1)[1])
+    else:
+        # The data store ignored the range and returned the whole object
+        size = len(first_part)
+
+    if buffer is None and size == len(first_part):
+        return first_part
+
+    if buffer is None:
+        data = bytearray(size)
+        view = memoryview(data)
+    else:
+        view = memoryview(buffer).cast("B")
+        if len(view) < size:
+            err_msg = f'{{"faasr_get_bytes":"buffer of {len(view)} bytes is too small for {key} ({size} bytes)"}}\n'
+            print(err_msg)
+            sys.exit(1)
+    view[:len(first_part)] = first_part
+
+    # Read the rest of the object in parts, which must belong to the same version as the first part
+    etag = response["ETag"]
+    chunksize = transfer_config.multipart_chunksize
+
+    def get_part(start):
+        end = min(start + chunksize, size) - 1
+        part = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)
+        view[start:end + 1] = part["Body"].read()
+
+    starts = range(len(first_part), size, chunksize)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, transfer_config.max_concurrency)) as executor:
+            list(executor.map(get_part, starts))
+    except ClientError as e:
+        if is_precondition_failed(e):
+            err_msg = f'{{"faasr_get_bytes":"{key} changed while it was being read"}}\n'
+            print(err_msg)
+            sys.exit(1)
+        raise
+
+    if buffer is None:
+        view.release()
+        return data
+    return size
@@ -1,12 +1,24 @@
-import boto3
 import re
 import os
 import sys
+import time
 from . import global_faasr as faasr_env
+from .s3_helper_functions import get_transfer_config, transfer_result
+from .file_cache import get_cached_file
 
-def faasr_get_file(local_file, remote_file, server_name="", local_folder=".", remote_folder="."):
+def faasr_get_file(local_file, remote_file, server_name="", local_folder=".", remote_folder=".",
+                   multipart_threshold=None, multipart_chunksize=None, max_concurrency=None, cache=None):
     """
     This function downloads a file from S3
+
+    Objects larger than multipart_threshold are downloaded with max_concurrency parallel
+    ranged GETs of multipart_chunksize bytes (defaults come from the data store)
+
+    If cache is True (default: the data store's "FileCache" field), the object is kept in a local
+    cache under /tmp, and later downloads of the unchanged object in the same container
+    only cost a HEAD request
+
+    returns a TransferResult with the number of bytes, seconds and throughput of the download
     """
     # to-do: config
     config = faasr_env.get_faasr()
@@ -24,6 +36,29 @@ def faasr_get_file(local_file, remote_file, server_name="", local_folder=".", re
     # Get the S3 data store to download the file from
     target_s3 = config['DataStores'][server_name]
 
+    # Get the local path and S3 key of the file
+    get_file, get_file_s3 = get_file_paths(local_file, remote_file, local_folder, remote_folder)
+
+    s3_client = config.get_s3_client(server_name)
+    transfer_config = get_transfer_config(target_s3, multipart_threshold, multipart_chunksize, max_concurrency)
+
+    # Download file from S3
+    # (download_file writes to a temporary file and renames it, replacing any existing local file)
+    start_time = time.perf_counter()
+    if cache is None:
+        cache = target_s3.get("FileCache", False)
+    if cache:
+        get_cached_file(s3_client, target_s3, get_file_s3, get_file, transfer_config)
+    else:
+        s3_client.download_file(Bucket = target_s3['Bucket'], Key = get_file_s3, Filename = get_file, Config = transfer_config)
+
+    return transfer_result(os.path.getsize(get_file), start_time)
+
+
+def get_file_paths(local_file, remote_file, local_folder=".", remote_folder="."):
+    """
+    Returns the normalized local path (under /tmp) and S3 key for downloading remote_file to local_file
+    """
     local_folder = f"/tmp/{local_folder}"
     
     # Removes duplicate/trailing slashes from folder and local file names
@@ -39,17 +74,4 @@ def faasr_get_file(local_file, remote_file, server_name="", local_folder=".", re
     else:
         get_file_s3 = f"{remote_folder}/{remote_file}"
 
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id = target_s3['AccessKey'],
-        aws_secret_access_key = target_s3['SecretKey'],
-        region_name = target_s3['Region'],
-        endpoint_url = target_s3['Endpoint']
-        )
-
-    # If the file already exists, delete it before downloading
-    if os.path.exists(get_file):
-        os.remove(get_file)
-
-    # Download file from S3
-    result = s3_client.download_file(Bucket = target_s3['Bucket'], Key = get_file_s3, Filename = get_file)
\ No newline at end of file
+    return get_file, get_file_s3
@@ -0,0 +1,96 @@
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import global_faasr as faasr_env
+from .get_file import get_file_paths
+from .s3_helper_functions import get_transfer_config, transfer_result, FileResult, DEFAULT_BATCH_WORKERS
+
+
+def faasr_get_files(files=None, server_name="", local_folder=".", remote_folder=".", remote_prefix=None,
+                    max_workers=DEFAULT_BATCH_WORKERS, multipart_threshold=None, multipart_chunksize=None,
+                    max_concurrency=None):
+    """
+    This function downloads many files from S3 concurrently
+
+    parameters:
+        files(list): (local_file, remote_file) pairs, relative to local_folder and remote_folder
+        remote_prefix(str): if given instead of files, every object under the prefix is downloaded
+                            to local_folder, keeping its path relative to the prefix
+                            (keys that would be written outside local_folder fail with a ValueError)
+        max_workers(int): maximum number of files downloaded at the same time
+
+    returns a list of FileResult(LocalFile, RemoteFile, Result, Error) in the order of files;
+    failed downloads have Error set instead of aborting the action
+    """
+    config = faasr_env.get_faasr()
+
+    # Get server name if one is not provided
+    if server_name == "":
+        server_name = config['DefaultDataStore']
+
+    # Ensure that the server is a data store in the payload
+    if server_name not in config['DataStores']:
+        err_msg = '{\"faasr_get_files\":\"Invalid data server name: ' + server_name + '\"}\n'
+        print(err_msg)
+        sys.exit(1)
+
+    # Get the S3 data store to download the files from
+    target_s3 = config['DataStores'][server_name]
+    s3_client = config.get_s3_client(server_name)
+    transfer_config = get_transfer_config(target_s3, multipart_threshold, multipart_chunksize, max_concurrency)
+
+    if files is None and remote_prefix is None:
+        err_msg = '{\"faasr_get_files\":\"Either files or remote_prefix must be given\"}\n'
+        print(err_msg)
+        sys.exit(1)
+
+    # Build the list of (local path, S3 key) to download, and the errors of keys that are not downloaded
+    rejected = {}
+    if remote_prefix is not None:
+        transfers = []
+        local_root = re.sub(r'/+', '/', f"/tmp/{local_folder}".rstrip('/'))
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=target_s3['Bucket'], Prefix=remote_prefix):
+            for content in page.get('Contents', []):
+                key = content['Key']
+                # Skip folder markers
+                if key.endswith('/'):
+                    continue
+                # Listed keys are downloaded as they are; only the local path is normalized
+                get_file = os.path.normpath(f"{local_root}/{key[len(remote_prefix):].lstrip('/')}")
+                # Keys with ".." parts must not write outside local_folder
+                if os.path.commonpath([local_root, get_file]) != local_root or get_file == local_root:
+                    rejected[key] = ValueError(f"{key} does not map to a file under {local_root}")
+                transfers.append((get_file, key))
+    else:
+        transfers = [
+            get_file_paths(local_file, remote_file, local_folder, remote_folder)
+            for local_file, remote_file in files
+        ]
+
+    def download(transfer):
+        get_file, get_file_s3 = transfer
+        if get_file_s3 in rejected:
+            return FileResult(get_file, get_file_s3, None, rejected[get_file_s3])
+        try:
+            os.makedirs(os.path.dirname(get_file), exist_ok=True)
+            start_time = time.perf_counter()
+            s3_client.download_file(
+                Bucket=target_s3['Bucket'], Key=get_file_s3, Filename=get_file, Config=transfer_config
+            )
+            return FileResult(get_file, get_file_s3, transfer_result(os.path.getsize(get_file), start_time), None)
+        except Exception as e:
+            return FileResult(get_file, get_file_s3, None, e)
+
+    # Download files with a bounded number of workers
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(download, transfers))
+
+    failed = sum(1 for result in results if result.Error is not None)
+    if failed:
+        err_msg = f'{{"faasr_get_files":"{failed} of {len(results)} downloads failed"}}\n'
+        print(err_msg)
+
+    return results
@@ -1,15 +1,48 @@
-import boto3
+import queue
 import sys
+import threading
+from collections import namedtuple
 from . import global_faasr as faasr_env
 
+# Default number of sub-prefixes listed at the same time by a parallel listing
+DEFAULT_LIST_WORKERS = 8
+
+# Entry returned by faasr_iter_folder_list when metadata is requested
+# (Size, ETag and LastModified are None for "directories" returned with a delimiter)
+S3Object = namedtuple("S3Object", ["Key", "Size", "ETag", "LastModified"])
+
+# Marks the end of a worker's results in a parallel listing
+LIST_DONE = object()
+
+
 def faasr_get_folder_list(server_name="", faasr_prefix = ""):
     """
     This function gets a list of objects in the S3 bucket
     """
-    # to-do: config
+    return list(faasr_iter_folder_list(server_name=server_name, faasr_prefix=faasr_prefix))
+
+
+def faasr_iter_folder_list(server_name="", faasr_prefix="", delimiter=None, metadata=False,
+                           parallel=False, max_workers=DEFAULT_LIST_WORKERS, page_size=1000):
+    """
+    This function lazily lists the objects in the S3 bucket, one page at a time
+
+    parameters:
+        server_name(str): data store to list (default data store if empty)
+        faasr_prefix(str): only list keys starting with this prefix
+        delimiter(str): if given, keys are grouped into "directories" (e.g. "/"), which are
+                        returned as prefixes ending with the delimiter
+        metadata(bool): yield S3Object(Key, Size, ETag, LastModified) instead of key strings
+        parallel(bool): list each first-level sub-prefix of faasr_prefix concurrently;
+                        the order of the results is not preserved (ignored with a delimiter)
+        max_workers(int): number of sub-prefixes listed at the same time when parallel is set
+        page_size(int): number of keys requested per list call (at most 1000)
+
+    yields keys (or S3Object entries); folder marker objects ending with "/" are skipped
+    """
     config = faasr_env.get_faasr()
 
-    # Get server name from payload if one is not providedS
+    # Get server name from payload if one is not provided
     if server_name == "":
         server_name = config['DefaultDataStore']
 
@@ -18,21 +51,111 @@ def faasr_get_folder_list(server_name="", faasr_prefix = ""):
         err_msg = '{\"faasr_get_folder_list\":\"Invalid data server name: ' + server_name + '\"}\n'
         print(err_msg)
         sys.exit(1)
-    
+
     # Get the S3 data store to get folder list from
     target_s3 = config['DataStores'][server_name]
 
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id = target_s3['AccessKey'],
-        aws_secret_access_key = target_s3['SecretKey'],
-        region_name = target_s3['Region'],
-        endpoint_url = target_s3['Endpoint']
-        )
-    
-    # List objects from S3 bucket
-    result = s3_client.list_objects_v2(Bucket = target_s3['Bucket'], Prefix = faasr_prefix)
-    result = [content['Key'] for content in result['Contents']]
-    result = [obj for obj in result if not obj.endswith('/')]
-
-    return result
\ No newline at end of file
+    s3_client = config.get_s3_client(server_name)
+
+    if parallel and delimiter is None:
+        yield from iter_parallel(s3_client, target_s3['Bucket'], faasr_prefix, metadata, max_workers, page_size)
+    else:
+        for page in iter_pages(s3_client, target_s3['Bucket'], faasr_prefix, delimiter, page_size):
+            yield from page_entries(page, metadata)
+
+
+def iter_pages(s3_client, bucket, prefix, delimiter=None, page_size=1000):
+    """
+    Yields the pages of a list_objects_v2 listing, following continuation tokens
+    """
+    list_args = {"Bucket": bucket, "Prefix": prefix, "PaginationConfig": {"PageSize": page_size}}
+    if delimiter is not None:
+        list_args["Delimiter"] = delimiter
+    paginator = s3_client.get_paginator("list_objects_v2")
+    yield from paginator.paginate(**list_args)
+
+
+def page_entries(page, metadata=False):
+    """
+    Returns the entries of a list_objects_v2 page ("Contents" is missing when a page is empty)
+    """
+    entries = []
+    for content in page.get('Contents', []):
+        if content['Key'].endswith('/'):
+            continue
+        if metadata:
+            entries.append(S3Object(content['Key'], content.get('Size'), content.get('ETag'), content.get('LastModified')))
+        else:
+            entries.append(content['Key'])
+    for common_prefix in page.get('CommonPrefixes', []):
+        if metadata:
+            entries.append(S3Object(common_prefix['Prefix'], None, None, None))
+        else:
+            entries.append(common_prefix['Prefix'])
+    return entries
+
+
+def iter_parallel(s3_client, bucket, prefix, metadata, max_workers, page_size):
+    """
+    Lists the first-level sub-prefixes of prefix concurrently
+
+    Pages are handed to the caller through a bounded queue, so memory stays bounded
+    even when the caller consumes the results slower than they are listed
+    """
+    # List the first level with a delimiter to split the prefix into sub-prefixes
+    sub_prefixes = []
+    for page in iter_pages(s3_client, bucket, prefix, "/", page_size):
+        # Objects directly under prefix are returned right away
+        yield from page_entries({"Contents": page.get("Contents", [])}, metadata)
+        sub_prefixes.extend(common_prefix["Prefix"] for common_prefix in page.get("CommonPrefixes", []))
+
+    if len(sub_prefixes) == 0:
+        return
+
+    results = queue.Queue(maxsize=2 * max_workers)
+    stop = threading.Event()
+    work = iter(sub_prefixes)
+    work_lock = threading.Lock()
+
+    def put(item):
+        # Wait for space in the queue unless the caller stopped iterating
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def worker():
+        try:
+            while not stop.is_set():
+                with work_lock:
+                    sub_prefix = next(work, None)
+                if sub_prefix is None:
+                    break
+                for page in iter_pages(s3_client, bucket, sub_prefix, None, page_size):
+                    if stop.is_set():
+                        break
+                    put(page_entries(page, metadata))
+        except Exception as e:
+            put(e)
+        finally:
+            put(LIST_DONE)
+
+    num_workers = max(1, min(max_workers, len(sub_prefixes)))
+    for _ in range(num_workers):
+        threading.Thread(target=worker, daemon=True).start()
+
+    finished = 0
+    try:
+        while finished < num_workers:
+            item = results.get()
+            if item is LIST_DONE:
+                finished += 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield from item
+    finally:
+        # Stop the workers if the caller stops iterating early
+        stop.set()
@@ -1,13 +1,149 @@
 import sys
 import json
-from .faasr_payload import FaaSr
+import threading
+import time
+from collections import namedtuple
 
 faasr = None # global faasr variable used for server side functions
 
+# Maximum number of DAG analyses kept by the runtime context
+MAX_DAG_ANALYSES = 64
+
+# Hit and miss counts of one runtime cache; Size is the number of entries it holds
+CacheStats = namedtuple("CacheStats", ["Hits", "Misses", "HitRate", "Size"])
+
+# Result of faasr_runtime_metrics
+#   Invocations: number of invocations started in this process
+#   WarmStart: True if the current invocation reuses a process that ran an earlier one
+#   UptimeSeconds: time since the runtime context was created (i.e. since the container started)
+#   Caches: cache name -> CacheStats
+RuntimeMetrics = namedtuple("RuntimeMetrics", ["Invocations", "WarmStart", "UptimeSeconds", "Caches"])
+
+
+class RuntimeContext:
+    """
+    State of the FaaSr runtime that outlives a single invocation
+
+    FaaS platforms (e.g. OpenWhisk and Lambda) reuse containers for many invocations, so the
+    expensive, payload-independent state is kept at module level: S3 and Lambda clients, the
+    compiled schema validator, validated payloads, DAG analyses keyed by the graph of the
+    workflow, verified data stores and resolved payload references. The context counts the hits
+    and misses of those caches, and begin_invocation resets the state that belongs to one invocation
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.invocations = 0
+        # cache name -> [hits, misses]
+        self.stats = {}
+        # functions and InvokeNext entries of a FunctionList -> DAGAnalysis
+        self.dag_analyses = {}
+
+    def record(self, cache, hit):
+        """
+        Counts a lookup in cache as a hit or a miss
+        """
+        with self.lock:
+            counts = self.stats.setdefault(cache, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def get_dag_analysis(self, graph):
+        """
+        Returns the cached DAG analysis of the workflow graph (None if it is not cached)
+        """
+        analysis = self.dag_analyses.get(graph)
+        self.record("DAGAnalyses", analysis is not None)
+        return analysis
+
+    def put_dag_analysis(self, graph, analysis):
+        """
+        Caches a DAG analysis, forgetting the oldest analysis when the cache is full
+        """
+        with self.lock:
+            if graph not in self.dag_analyses and len(self.dag_analyses) >= MAX_DAG_ANALYSES:
+                self.dag_analyses.pop(next(iter(self.dag_analyses)))
+            self.dag_analyses[graph] = analysis
+
+    def begin_invocation(self):
+        """
+        Resets the per-invocation state before an action starts
+
+        Log messages still buffered by an earlier action are written to its log, and locks
+        it did not release are forgotten (their leases expire on the data store)
+        """
+        global faasr
+        from .log import log_buffer
+        from .faasr_lock import held_locks
+        from .tracing import tracer
+
+        log_buffer.flush()
+        log_buffer.new_writer()
+        held_locks.clear()
+        tracer.reset()
+        faasr = None
+        with self.lock:
+            self.invocations += 1
+
+    def clear(self):
+        """
+        Drops every cache of the runtime, as if the container had just started
+        """
+        from .graph_functions import validated_payloads
+        from .s3_helper_functions import s3_client_registry, verified_data_stores
+        from .payload_reference import payload_cache
+        from . import graph_functions, faasr_trigger
+
+        s3_client_registry.clear()
+        verified_data_stores.clear()
+        validated_payloads.clear()
+        payload_cache.clear()
+        faasr_trigger.lambda_clients.clear()
+        faasr_trigger.http_session = None
+        graph_functions.schema_validator = None
+        with self.lock:
+            self.dag_analyses.clear()
+            self.stats.clear()
+
+    def get_metrics(self):
+        """
+        Returns the RuntimeMetrics of this process
+        """
+        from .graph_functions import validated_payloads
+        from .s3_helper_functions import s3_client_registry, verified_data_stores
+        from .payload_reference import payload_cache
+        from . import graph_functions, faasr_trigger
+
+        sizes = {
+            "S3Clients": len(s3_client_registry.clients),
+            "LambdaClients": len(faasr_trigger.lambda_clients),
+            "SchemaValidator": int(graph_functions.schema_validator is not None),
+            "ValidatedPayloads": len(validated_payloads),
+            "DAGAnalyses": len(self.dag_analyses),
+            "DataStoreChecks": len(verified_data_stores),
+            "PayloadReferences": len(payload_cache),
+        }
+        with self.lock:
+            # Caches without a size (e.g. the file cache, whose size would take a directory scan) report None
+            for cache in self.stats:
+                sizes.setdefault(cache, None)
+            caches = {}
+            for cache, size in sizes.items():
+                hits, misses = self.stats.get(cache, (0, 0))
+                lookups = hits + misses
+                caches[cache] = CacheStats(hits, misses, hits / lookups if lookups else None, size)
+            return RuntimeMetrics(self.invocations, self.invocations > 1, time.monotonic() - self.started, caches)
+
+
+# runtime context shared by every invocation in this process
+runtime = RuntimeContext()
+
 
 # Initializes global faasr variable and returns a reference to it
 def initialize_faasr(payload_json):
     global faasr
+    # Imported here, so server-side APIs that only read the payload do not load the whole runtime
+    from .faasr_payload import FaaSr
     faasr = FaaSr(payload_json)
     return faasr
 
@@ -18,4 +154,12 @@ def get_faasr():
         err_msg = '{\"get_faasr\":\"global faasr instance not initialized (internal issue)\"}\n'
         print(err_msg)
         sys.exit(1)
-    return faasr
\ No newline at end of file
+    return faasr
+
+
+def faasr_runtime_metrics():
+    """
+    This function returns the RuntimeMetrics of this container: the number of invocations it has run
+    and the hits and misses of the caches reused across warm invocations
+    """
+    return runtime.get_metrics()
@@ -1,137 +1,262 @@
 import json
 import sys
-import re
-from collections import defaultdict
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
+import hashlib
+import threading
+from collections import namedtuple
+from .global_faasr import runtime
+
+# The FaaSr schema is not shipped with the package: it is read from the current working directory
+SCHEMA_FILE = "FaaSr.schema.json"
+
+# Maximum number of payload digests remembered by validate_json
+MAX_VALIDATED_PAYLOADS = 64
+
+# Compiled schema validator, built once per process and reused by warm invocations
+schema_validator = None
+schema_lock = threading.Lock()
+
+# Payload digest -> validation error message (None if the payload is valid)
+validated_payloads = {}
+
+
+def load_schema():
+    """
+    Loads the FaaSr schema from FaaSr.schema.json in the current working directory
+    """
+    with open(SCHEMA_FILE, "r") as f:
+        return json.load(f)
+
+
+def get_schema_validator():
+    """
+    Returns the compiled validator for the FaaSr schema, building it on first use
+    """
+    global schema_validator
+    runtime.record("SchemaValidator", schema_validator is not None)
+    if schema_validator is None:
+        with schema_lock:
+            if schema_validator is None:
+                # jsonschema is imported on first use to keep it out of the package import
+                from jsonschema.validators import validator_for
+                schema = load_schema()
+                validator_class = validator_for(schema)
+                validator_class.check_schema(schema)
+                schema_validator = validator_class(schema)
+    return schema_validator
 
 
 def validate_json(payload):
     """
     This method is used to verify that the JSON payload is compliant with the FaaSr schema
+
+    Results are memoized by payload digest, so identical payloads are only validated once per process
     """
     if isinstance(payload, str):
+        payload_json = payload
         payload = json.loads(payload)
-        
-    #Open FaaSr schema
-    with open('FaaSr.schema.json', "r") as f:
-        schema = json.load(f)
-    
-    #Compare payload against FaaSr schema and except if they do not match
-    try:
-        validate(instance=payload, schema=schema)
-    except ValidationError as e:
-        err_msg = '{\"faasr_validate_json\":\"JSON not compliant with FaaSr schema : ' + e.message,'\"}\n'
+    else:
+        payload_json = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(payload_json.encode()).hexdigest()
+
+    runtime.record("ValidatedPayloads", digest in validated_payloads)
+    if digest in validated_payloads:
+        err_msg = validated_payloads[digest]
+    else:
+        #Compare payload against FaaSr schema
+        from jsonschema.exceptions import best_match
+        error = best_match(get_schema_validator().iter_errors(payload))
+        if error is None:
+            err_msg = None
+        else:
+            err_msg = '{\"faasr_validate_json\":\"JSON not compliant with FaaSr schema : ' + error.message + '\"}\n'
+
+        # Remember the result, forgetting the oldest payload when the memo is full
+        if len(validated_payloads) >= MAX_VALIDATED_PAYLOADS:
+            validated_payloads.pop(next(iter(validated_payloads)))
+        validated_payloads[digest] = err_msg
+
+    if err_msg is not None:
         print(err_msg)
     return True
 
 
-def is_cyclic(adj_graph, curr, visited, stack):
-    """This recursive function checks if there is a cycle in a directed
-    graph specified by an adjacency list
+# Result of analyze_dag
+#   Successors/Predecessors: function -> list of successor/predecessor functions
+#   Ranks: function -> number of ranks it is invoked with ("Func(N)" in InvokeNext)
+#   Levels: function -> length of the longest path from an initial function
+#   Order: functions in topological order
+#   Start: first function in FunctionList with no predecessors (None if there is none)
+#   Cycle: (from, to) edge closing a loop (None if the workflow is acyclic)
+#   Unreachable: functions that cannot be reached from Start
+DAGAnalysis = namedtuple(
+    "DAGAnalysis",
+    ["Successors", "Predecessors", "Ranks", "Levels", "Order", "Start", "Cycle", "Unreachable"],
+)
 
-    parameters:
-        adj_graph(dict): adjacency list for graph
-        curr(str): current node
-        visited(set): set of visited nodes 
-        stack(list[]): list of nodes in recursion call stack
-    """
-    # if the current node is in the recursion call
-    # stack then there must be a cycle in the graph
-    if curr in stack:
-        return True
-    
-    # add current node to recursion call stack and visited set
-    visited.add(curr)
-    stack.append(curr)
-
-    # check each successor for cycles, recursively calling is_cyclic()
-    for child in adj_graph[curr]:
-        if child not in visited and is_cyclic(adj_graph, child, visited, stack):
-            err = '{\"faasr_check_workflow_cycle\":\"Function loop found from node ' + curr + ' to ' + child + '\"}\n'
-            print(err)
-            sys.exit(1)
-        elif child in stack:
-            err = '{\"faasr_check_workflow_cycle\":\"Function loop found from node ' + curr + ' to ' + child + '\"}\n'
-            print(err)
-            sys.exit(1)
-    
-    # no more successors to visit for this branch and no cycles found
-    # remove current node from recursion call stack
-    stack.pop()
-    return False
-
-
-def check_dag(payload):
+
+def parse_invoke_next(entry):
     """
-    This method checks for cycles, repeated function names, or unreachable nodes in the workflow
-    and aborts if it finds any
+    Splits an InvokeNext entry of the form "Func" or "Func(N)" into (Func, N)
 
-    returns a list of predecessors for the current function
+    The entry is split with str.partition rather than a regular expression, since it is
+    parsed for every edge of the workflow
+    """
+    func, paren, rank = entry.partition("(")
+    if not paren:
+        if func and ")" not in func:
+            return func, 1
+    elif func and ")" not in func and rank[-1:] == ")" and rank[:-1].isdecimal():
+        return func, int(rank[:-1])
+    err_msg = '{\"parse_invoke_next\":\"Invalid InvokeNext entry: ' + str(entry) + '\"}\n'
+    print(err_msg)
+    sys.exit(1)
+
+
+def analyze_dag(function_list):
     """
+    Analyzes the workflow graph in a single O(V+E) pass without recursion
+
+    parameters:
+        function_list(dict): FunctionList of the payload
 
-    adj_graph = defaultdict(list)
+    returns a DAGAnalysis
+    """
+    successors = {}
+    predecessors = {func: [] for func in function_list}
+    ranks = {}
 
-    # Build the adjacency list
-    for func in payload['FunctionList'].keys():
-        invoke_next = payload['FunctionList'][func]['InvokeNext']
+    # Build the adjacency lists; plain function names are used as they are,
+    # only entries with a number of ranks need to be parsed
+    for func, func_info in function_list.items():
+        invoke_next = func_info['InvokeNext']
         if isinstance(invoke_next, str):
             invoke_next = [invoke_next]
-        for child in invoke_next:
-            child = re.sub(r"\(.*", "", child)
-            adj_graph[func].append(child)
+        children = []
+        for entry in invoke_next:
+            if entry and "(" not in entry and ")" not in entry:
+                child = entry
+            else:
+                child, rank = parse_invoke_next(entry)
+                if rank > 1:
+                    ranks[child] = rank
+            children.append(child)
+            pre = predecessors.get(child)
+            if pre is None:
+                predecessors[child] = [func]
+            else:
+                pre.append(func)
+        successors[func] = children
+    for func in predecessors:
+        if func not in successors:
+            successors[func] = []
 
-    # Initialize empty recursion call stack
-    stack = []
+    # Topological sort (Kahn's algorithm), computing the level of each function on the way
+    # Functions are appended once all of their predecessors are in the order, so their level is final by then
+    in_degree = {func: len(pre) for func, pre in predecessors.items()}
+    levels = {func: 0 for func, degree in in_degree.items() if degree == 0}
+    order = list(levels)
+    source_count = len(order)
+    for func in order:
+        child_level = levels[func] + 1
+        for child in successors[func]:
+            if levels.get(child, 0) < child_level:
+                levels[child] = child_level
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                order.append(child)
 
-    # Initialize empty visited set
-    visited = set()
+    # Every function left out of the order is on a loop or downstream of one
+    # Walking predecessors that are also left out must eventually revisit a function, closing the loop
+    cycle = None
+    if len(order) != len(predecessors):
+        remaining = {func for func, degree in in_degree.items() if degree > 0}
+        func = next(iter(remaining))
+        seen = set()
+        while func not in seen:
+            seen.add(func)
+            pre_func = next(pre for pre in predecessors[func] if pre in remaining)
+            cycle = (pre_func, func)
+            func = pre_func
 
-    # Initialize predecessor list
-    pre = predecessors_list(adj_graph)
-    
     # Find initial function in the graph
-    start = False
-    for func in payload['FunctionList']:
-        if len(pre[func]) == 0:
-            start = True
-            # This function stores the first function with no predecessors
-            # In the cases where there is multiple functions with no
-            # predecessors, an unreachable state error will occur later
-            first_func = func
-            break
+    # In the cases where there is multiple functions with no
+    # predecessors, the others are reported as unreachable
+    # Functions without predecessors come first in the order, in FunctionList order
+    start = order[0] if source_count > 0 else None
+
+    # Find the functions that cannot be reached from the initial function
+    # Every function of an acyclic workflow with a single initial function is reachable from it
+    unreachable = []
+    if start is not None and (source_count > 1 or cycle is not None):
+        visited = {start}
+        stack = [start]
+        while stack:
+            for child in successors[stack.pop()]:
+                if child not in visited:
+                    visited.add(child)
+                    stack.append(child)
+        unreachable = [func for func in function_list if func not in visited]
+
+    return DAGAnalysis(successors, predecessors, ranks, levels, order, start, cycle, unreachable)
+
+
+def get_dag_analysis(function_list):
+    """
+    Returns the DAG analysis of a workflow, reusing the analysis of an earlier invocation of the same workflow
+
+    Analyses are cached in the runtime context, keyed by the functions and their InvokeNext
+    entries (the only fields analyze_dag reads) as a tuple, so the actions of every rank share one analysis.
+    Building the key walks the whole FunctionList, so actions call this once per payload
+    (FaaSr.get_dag_analysis). The cached analysis is shared: callers must not modify it
+    """
+    # FunctionList order is kept, since the initial function is the first one without predecessors
+    # The tuple is compared entry by entry on lookup, so different workflows never share an analysis
+    graph = []
+    for func, func_info in function_list.items():
+        invoke_next = func_info['InvokeNext']
+        graph.append((func, tuple(invoke_next) if isinstance(invoke_next, list) else invoke_next))
+    graph = tuple(graph)
+
+    analysis = runtime.get_dag_analysis(graph)
+    if analysis is None:
+        analysis = analyze_dag(function_list)
+        runtime.put_dag_analysis(graph, analysis)
+    return analysis
+
+
+def check_dag(payload, analysis=None):
+    """
+    This method checks for cycles, repeated function names, or unreachable nodes in the workflow
+    and aborts if it finds any
+
+    analysis is the DAG analysis of the payload, if it was already computed (see FaaSr.get_dag_analysis)
+
+    returns a list of predecessors for the current function
+    """
+    if analysis is None:
+        analysis = get_dag_analysis(payload['FunctionList'])
 
     # Ensure there is an initial action
-    if start is False:
+    if analysis.Start is None:
         err_msg = '{\"faasr_check_workflow_cycle\":\"function loop found: no initial action\"}\n'
         print(err_msg)
         sys.exit(1)
 
     # Check for cycles
-    is_cyclic(adj_graph, first_func, visited, stack)
-
-    # Check if all of the functions have been visited by the DFS
-    # If not, then there is an unreachable state in the graph
-    for func in payload['FunctionList']:
-        if func.split('(')[0] not in visited:
-            err = '{\"check_workflow_cycle\":\"unreachable state found: ' + func + '\"}\n'
-            print(err)
-            sys.exit(1)
-
-    return pre[payload['FunctionInvoke']]
-    
-
-def predecessors_list(adj_graph):
-    """This function returns a map of action predecessor pairs
-    
-    parameters:
-        adj_graph(dict): adjacency list for graph (function: successor)
-    """
-    pre = defaultdict(list)
-    for func1 in adj_graph:
-        for func2 in adj_graph[func1]:
-            pre[func2].append(func1)
-    return pre 
+    if analysis.Cycle is not None:
+        err = '{\"faasr_check_workflow_cycle\":\"Function loop found from node ' + analysis.Cycle[0] + ' to ' + analysis.Cycle[1] + '\"}\n'
+        print(err)
+        sys.exit(1)
+
+    # If not all of the functions were reached from the initial function,
+    # then there is an unreachable state in the graph
+    if len(analysis.Unreachable) != 0:
+        err = '{\"check_workflow_cycle\":\"unreachable state found: ' + analysis.Unreachable[0] + '\"}\n'
+        print(err)
+        sys.exit(1)
+
+    # Return a copy, so callers can modify it without changing the analysis
+    return list(analysis.Predecessors.get(payload['FunctionInvoke'], []))
 
 
 def faasr_replace_values(payload, secrets):
@@ -0,0 +1,189 @@
+import copy
+import json
+import sys
+import tempfile
+import time
+import uuid
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from . import faasr_trigger
+from . import log
+from .faasr_start import faasr_start
+from .graph_functions import analyze_dag
+from .local_s3 import MemoryS3Client, FileSystemS3Client
+from .s3_helper_functions import s3_client_registry
+from .tracing import flush_trace
+
+# Result of running one action locally
+#   Function: FunctionInvoke of the action
+#   Rank: "rank/max rank" for ranked functions and None otherwise
+#   ExitCode: 0 if the action finished, the sys.exit code if it aborted (e.g. after losing a join election)
+#   Seconds: wall time of the action, including faasr_start and trigger
+#   Error: message of an unexpected exception (None otherwise)
+ActionResult = namedtuple("ActionResult", ["Function", "Rank", "ExitCode", "Seconds", "Error"])
+
+# State of a process pool worker: the user functions and the invocations queued by the current action
+worker_functions = {}
+worker_invocations = []
+
+
+def faasr_run_local(payload, functions, store=None, processes=0, store_root=None, local_servers=True):
+    """
+    This function runs a workflow end to end on this machine
+
+    Each action is driven through faasr_start, run_user_function and trigger, as it would be on a
+    FaaS platform. Invocations of functions on "Local" compute servers are queued and run by the runner,
+    and every server-side API reads and writes an S3 stand-in instead of the data stores
+
+    parameters:
+        payload(dict or str): workflow JSON; InvocationID and FunctionInvoke are filled in if missing
+        functions(dict): FunctionName -> python function
+        store: "memory", "filesystem", or an S3 client stand-in (e.g. a MemoryS3Client to inspect afterwards)
+               (default: "filesystem" if processes is greater than 0, "memory" otherwise)
+        processes(int): if greater than 0, actions run in a pool of that many processes,
+                        so ranks run in parallel on separate cores (requires the filesystem store)
+        store_root(str): folder of the filesystem store (a new temporary folder by default)
+        local_servers(bool): run the functions of every compute server locally
+
+    returns a list of ActionResult, in the order the actions finished
+    """
+    payload = prepare_local_payload(payload, local_servers)
+
+    # Processes only share the filesystem store
+    if store is None:
+        store = "filesystem" if processes > 0 else "memory"
+
+    if processes > 0:
+        if store == "memory" or not (store == "filesystem" or isinstance(store, FileSystemS3Client)):
+            err_msg = '{"faasr_run_local":"running actions in processes requires the filesystem store"}\n'
+            print(err_msg)
+            sys.exit(1)
+        if isinstance(store, FileSystemS3Client):
+            store_root = store.root
+        elif store_root is None:
+            store_root = tempfile.mkdtemp(prefix="faasr-local-")
+        return run_in_processes(payload, functions, processes, store_root)
+
+    if store == "memory":
+        store = MemoryS3Client()
+    elif store == "filesystem":
+        store = FileSystemS3Client(store_root or tempfile.mkdtemp(prefix="faasr-local-"))
+
+    # Actions queued by trigger() run in this process, one after the other
+    pending = deque([json.dumps(payload)])
+
+    def queue_invocation(function, payload_json):
+        pending.append(payload_json)
+        return True, f"Local: Successfully queued {function}"
+
+    s3_client_registry.set_client_factory(lambda target_s3: store)
+    faasr_trigger.local_invoker = queue_invocation
+    results = []
+    try:
+        while pending:
+            results.append(run_action(pending.popleft(), functions))
+    finally:
+        faasr_trigger.local_invoker = None
+        s3_client_registry.set_client_factory(None)
+    return results
+
+
+def prepare_local_payload(payload, local_servers):
+    """
+    Returns a copy of the workflow JSON that is ready to run locally
+    """
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    payload = copy.deepcopy(payload)
+
+    if not payload.get("InvocationID"):
+        payload["InvocationID"] = str(uuid.uuid4())
+    if not payload.get("FunctionInvoke"):
+        payload["FunctionInvoke"] = analyze_dag(payload["FunctionList"]).Start
+
+    if local_servers:
+        for compute_server in payload["ComputeServers"].values():
+            compute_server["FaaSType"] = "Local"
+
+    # The S3 stand-in ignores endpoints and credentials, but the data store checks expect them
+    for data_store in payload["DataStores"].values():
+        data_store.setdefault("Endpoint", "http://localhost")
+        data_store.setdefault("Region", "")
+        data_store.setdefault("AccessKey", "local")
+        data_store.setdefault("SecretKey", "local")
+    return payload
+
+
+def run_action(payload_json, functions):
+    """
+    Runs one action in this process
+
+    returns an ActionResult; aborts (sys.exit) and errors of the action are recorded instead of raised
+    """
+    payload = json.loads(payload_json)
+    function = payload["FunctionInvoke"]
+    # Payloads passed by reference carry the rank of the action at the top level
+    rank = payload.get("Rank", payload.get("FunctionList", {}).get(function, {}).get("Rank")) or None
+
+    start = time.perf_counter()
+    exit_code = 0
+    error = None
+    try:
+        faasr_obj = faasr_start(payload)
+        faasr_obj.run_user_function(functions)
+        faasr_obj.trigger()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        exit_code = 1
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        log.flush_log()
+        flush_trace()
+    return ActionResult(function, rank, exit_code, time.perf_counter() - start, error)
+
+
+def run_in_processes(payload, functions, processes, store_root):
+    """
+    Runs the workflow in a pool of processes sharing a filesystem store
+
+    Workers return the invocations queued by each action, and the runner submits them to the pool
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(store_root, functions)) as executor:
+        futures = {executor.submit(run_worker_action, json.dumps(payload))}
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                result, invocations = future.result()
+                results.append(result)
+                for payload_json in invocations:
+                    futures.add(executor.submit(run_worker_action, payload_json))
+    return results
+
+
+def init_worker(store_root, functions):
+    """
+    Sets up a process pool worker: S3 stand-in, user functions and local invocations
+    """
+    global worker_functions
+    worker_functions = functions
+    store = FileSystemS3Client(store_root)
+    s3_client_registry.set_client_factory(lambda target_s3: store)
+
+    def queue_invocation(function, payload_json):
+        worker_invocations.append(payload_json)
+        return True, f"Local: Successfully queued {function}"
+
+    faasr_trigger.local_invoker = queue_invocation
+
+
+def run_worker_action(payload_json):
+    """
+    Runs one action in a process pool worker
+
+    returns (ActionResult, serialized payloads of the invocations it queued)
+    """
+    worker_invocations.clear()
+    result = run_action(payload_json, worker_functions)
+    return result, list(worker_invocations)
@@ -0,0 +1,325 @@
+import datetime
+import hashlib
+import io
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+from botocore.exceptions import ClientError
+from .tracing import record_request, request_counter
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (Windows), the filesystem store is only safe within one process
+    fcntl = None
+
+# Suffix of the files holding objects in a FileSystemS3Client store
+# ("~" is always escaped in key parts, so the suffix never appears in a folder name)
+OBJECT_SUFFIX = "~obj"
+
+
+def client_error(code, status, operation, message=""):
+    """
+    Returns a botocore ClientError shaped like the error S3 returns for code and HTTP status
+    """
+    return ClientError(
+        {"Error": {"Code": code, "Message": message or code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        operation,
+    )
+
+
+def make_etag(data):
+    """
+    Returns the ETag of an object: the quoted MD5 of its content, as S3 computes it for single-part uploads
+    """
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+def parse_range(range_header, size):
+    """
+    Returns the (start, end) byte positions (end inclusive) of an HTTP Range header "bytes=..."
+    """
+    first, _, last = range_header.split("=", 1)[1].partition("-")
+    if first == "":
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = size - 1 if last == "" else min(int(last), size - 1)
+    if start >= size or start > end:
+        raise client_error("InvalidRange", 416, "GetObject")
+    return start, end
+
+
+class LocalS3Client:
+    """
+    S3 stand-in implementing the part of the boto3 S3 client that FaaSr_py uses
+
+    Subclasses store the objects; this class implements the S3 semantics on top of
+    read_object, write_object, remove_object and list_keys. Writes run under locked(),
+    so conditional puts (IfNoneMatch/IfMatch) are atomic
+    """
+
+    def put_object(self, Bucket, Key, Body=b"", IfNoneMatch=None, IfMatch=None, **kwargs):
+        if hasattr(Body, "read"):
+            Body = Body.read()
+        if isinstance(Body, str):
+            Body = Body.encode()
+        data = bytes(Body)
+        record_request(len(data), 0)
+        with self.locked():
+            existing = self.read_object(Bucket, Key)
+            if IfNoneMatch == "*" and existing is not None:
+                raise client_error("PreconditionFailed", 412, "PutObject")
+            if IfMatch is not None and (existing is None or make_etag(existing[0]) != IfMatch):
+                raise client_error("PreconditionFailed", 412, "PutObject")
+            self.write_object(Bucket, Key, data)
+        return {"ETag": make_etag(data)}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None, **kwargs):
+        existing = self.read_object(Bucket, Key)
+        record_request(0, 0)
+        if existing is None:
+            raise client_error("NoSuchKey", 404, "GetObject")
+        data, last_modified = existing
+        etag = make_etag(data)
+        if IfMatch is not None and IfMatch != etag:
+            raise client_error("PreconditionFailed", 412, "GetObject")
+        response = {"ETag": etag, "LastModified": last_modified}
+        if Range is not None:
+            start, end = parse_range(Range, len(data))
+            response["ContentRange"] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+        response["ContentLength"] = len(data)
+        response["Body"] = io.BytesIO(data)
+        request_counter.add_received(len(data))
+        return response
+
+    def head_object(self, Bucket, Key, **kwargs):
+        record_request()
+        existing = self.read_object(Bucket, Key)
+        if existing is None:
+            raise client_error("404", 404, "HeadObject", "Not Found")
+        data, last_modified = existing
+        return {"ContentLength": len(data), "ETag": make_etag(data), "LastModified": last_modified}
+
+    def head_bucket(self, Bucket, **kwargs):
+        record_request()
+        return {}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        record_request()
+        with self.locked():
+            self.remove_object(Bucket, Key)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        record_request()
+        deleted = []
+        with self.locked():
+            for entry in Delete["Objects"]:
+                self.remove_object(Bucket, entry["Key"])
+                deleted.append({"Key": entry["Key"]})
+        if Delete.get("Quiet", False):
+            return {}
+        return {"Deleted": deleted}
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, StartAfter="", MaxKeys=1000,
+                        ContinuationToken=None, **kwargs):
+        record_request()
+        # The continuation token is the last key (or common prefix) returned by the previous page
+        after = max(StartAfter or "", ContinuationToken or "")
+
+        # Keys with the same prefix are adjacent once sorted, so each common prefix is added once
+        entries = []
+        for key in sorted(key for key in self.list_keys(Bucket) if key.startswith(Prefix)):
+            if Delimiter:
+                head, delimiter, _ = key[len(Prefix):].partition(Delimiter)
+                if delimiter:
+                    common_prefix = Prefix + head + Delimiter
+                    if len(entries) == 0 or entries[-1] != (common_prefix, True):
+                        entries.append((common_prefix, True))
+                    continue
+            entries.append((key, False))
+        entries = [entry for entry in entries if entry[0] > after]
+
+        page = entries[:MaxKeys]
+        contents = []
+        for key, is_prefix in page:
+            existing = None if is_prefix else self.read_object(Bucket, key)
+            if existing is not None:
+                data, last_modified = existing
+                contents.append({"Key": key, "Size": len(data), "ETag": make_etag(data), "LastModified": last_modified})
+        common_prefixes = [{"Prefix": key} for key, is_prefix in page if is_prefix]
+
+        response = {"KeyCount": len(page), "IsTruncated": len(entries) > MaxKeys, "Prefix": Prefix, "MaxKeys": MaxKeys}
+        if contents:
+            response["Contents"] = contents
+        if common_prefixes:
+            response["CommonPrefixes"] = common_prefixes
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1][0]
+        return response
+
+    def get_paginator(self, operation_name):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(f"local S3 does not paginate {operation_name}")
+        return LocalListPaginator(self)
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        with open(Filename, "rb") as f:
+            self.put_object(Bucket=Bucket, Key=Key, Body=f.read())
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        existing = self.read_object(Bucket, Key)
+        if existing is None:
+            raise client_error("404", 404, "HeadObject", "Not Found")
+        record_request(0, len(existing[0]))
+        with open(Filename, "wb") as f:
+            f.write(existing[0])
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj.read())
+
+    def download_fileobj(self, Bucket, Key, Fileobj, ExtraArgs=None, Callback=None, Config=None):
+        existing = self.read_object(Bucket, Key)
+        if existing is None:
+            raise client_error("404", 404, "HeadObject", "Not Found")
+        record_request(0, len(existing[0]))
+        Fileobj.write(existing[0])
+
+
+class LocalListPaginator:
+    """
+    Paginator for LocalS3Client.list_objects_v2, following continuation tokens like boto3's
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, PaginationConfig=None, **kwargs):
+        page_size = (PaginationConfig or {}).get("PageSize", 1000)
+        token = None
+        while True:
+            page = self.client.list_objects_v2(MaxKeys=page_size, ContinuationToken=token, **kwargs)
+            yield page
+            if not page["IsTruncated"]:
+                return
+            token = page["NextContinuationToken"]
+
+
+class MemoryS3Client(LocalS3Client):
+    """
+    S3 stand-in keeping the objects in memory; shared by the threads of one process
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.RLock()
+
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            yield
+
+    def read_object(self, bucket, key):
+        return self.buckets.get(bucket, {}).get(key)
+
+    def write_object(self, bucket, key, data):
+        self.buckets.setdefault(bucket, {})[key] = (data, datetime.datetime.now(datetime.timezone.utc))
+
+    def remove_object(self, bucket, key):
+        self.buckets.get(bucket, {}).pop(key, None)
+
+    def list_keys(self, bucket):
+        with self.lock:
+            return list(self.buckets.get(bucket, {}))
+
+
+class FileSystemS3Client(LocalS3Client):
+    """
+    S3 stand-in keeping the objects in files under root/{bucket}; shared by processes on the same host
+
+    Key parts become folders and the last part becomes a file with OBJECT_SUFFIX, so keys such as
+    "a/b" and "a/b/c" can exist at the same time. Writes are serialized with a lock file
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.lock = threading.RLock()
+
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.root, ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def object_path(self, bucket, key):
+        parts = [encode_key_part(part) for part in key.split("/")]
+        parts[-1] += OBJECT_SUFFIX
+        return os.path.join(self.root, encode_key_part(bucket), *parts)
+
+    def read_object(self, bucket, key):
+        path = self.object_path(bucket, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            modified = os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+        return data, datetime.datetime.fromtimestamp(modified, datetime.timezone.utc)
+
+    def write_object(self, bucket, key, data):
+        path = self.object_path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so readers never see a partial object
+        temp_path = os.path.join(os.path.dirname(path), f".tmp-{uuid.uuid4().hex}")
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def remove_object(self, bucket, key):
+        try:
+            os.remove(self.object_path(bucket, key))
+        except FileNotFoundError:
+            pass
+
+    def list_keys(self, bucket):
+        bucket_root = os.path.join(self.root, encode_key_part(bucket))
+        keys = []
+        for folder, _, files in os.walk(bucket_root):
+            relative = os.path.relpath(folder, bucket_root)
+            prefix_parts = [] if relative == "." else [unquote(part) for part in relative.split(os.sep)]
+            for file_name in files:
+                if file_name.endswith(OBJECT_SUFFIX):
+                    keys.append("/".join(prefix_parts + [unquote(file_name[:-len(OBJECT_SUFFIX)])]))
+        return keys
+
+    def clear(self):
+        """
+        Deletes every object in the store
+        """
+        with self.locked():
+            for entry in os.listdir(self.root):
+                if entry != ".lock":
+                    shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+
+
+def encode_key_part(part):
+    """
+    Returns a key part as a file name: percent-encoded, with "~" and leading dots escaped
+    """
+    encoded = quote(part, safe="").replace("~", "%7E")
+    if encoded.startswith("."):
+        encoded = "%2E" + encoded[1:]
+    return encoded
@@ -1,12 +1,131 @@
-import boto3
-import os
+import atexit
 import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
 from . import global_faasr as faasr_env
 
+# Default thresholds for flushing buffered log messages to S3
+# They can be overridden with the optional "LogFlushBytes" and "LogFlushInterval" payload fields
+DEFAULT_LOG_FLUSH_BYTES = 64 * 1024
+DEFAULT_LOG_FLUSH_INTERVAL = 5
+
+
+class LogBuffer:
+    """
+    Collects log messages in memory and writes them to S3 in batches
+
+    In "chunk" mode (default) every flush writes a new append-only object under
+    {FaaSrLog}/{InvocationID}/{FunctionInvoke}/log/, so the cost of a flush does not
+    depend on the size of the log. In "final" mode messages are only written at the
+    checkpoints of the action (before its .done marker and when it ends), as one object per
+    writer, {FaaSrLog}/{InvocationID}/{FunctionInvoke}[.rank]-{writer id}.txt, so ranks,
+    join invocations and retries of the same function never overwrite each other's logs
+
+    Messages are taken from the buffer under lock, but written to S3 after releasing it,
+    so callers of faasr_log never wait for a flush in another thread
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # serializes writes, so a "final" log written at a checkpoint is never replaced by an older version
+        self.write_lock = threading.Lock()
+        # timer that flushes the buffer once its oldest message reaches the time threshold
+        self.timer = None
+        # (s3 client, bucket, log folder, function, mode) -> list of pending messages
+        self.pending = defaultdict(list)
+        self.pending_bytes = 0
+        self.oldest_pending = None
+        # log contents already written in "final" mode
+        self.written = defaultdict(list)
+        self.chunk_count = 0
+        # unique id so concurrent writers of the same log never overwrite each other's objects
+        self.writer_id = uuid.uuid4().hex[:12]
+
+    def new_writer(self):
+        """
+        Starts the log of a new action in this process, with a new writer id
+        """
+        with self.write_lock:
+            self.written.clear()
+            self.writer_id = uuid.uuid4().hex[:12]
+
+    def append(self, target, message, flush_interval=None):
+        """
+        Adds a message to the buffer for the log identified by target
+
+        If flush_interval is given, the buffer is flushed flush_interval seconds after its oldest message
+        was added, even if faasr_log is not called again (e.g. during a long computation)
+        """
+        with self.lock:
+            self.pending[target].append(message)
+            self.pending_bytes += len(message)
+            if self.oldest_pending is None:
+                self.oldest_pending = time.monotonic()
+                if flush_interval is not None:
+                    self.timer = threading.Timer(flush_interval, self.flush)
+                    # The timer must not keep the process alive; the atexit hook flushes the rest
+                    self.timer.daemon = True
+                    self.timer.start()
+
+    def should_flush(self, flush_bytes, flush_interval):
+        """
+        Returns True if the size or time threshold has been reached
+        """
+        with self.lock:
+            if self.oldest_pending is None:
+                return False
+            return (
+                self.pending_bytes >= flush_bytes
+                or time.monotonic() - self.oldest_pending >= flush_interval
+            )
+
+    def flush(self):
+        """
+        Writes all pending messages to S3
+        """
+        with self.lock:
+            pending = self.pending
+            self.pending = defaultdict(list)
+            self.pending_bytes = 0
+            self.oldest_pending = None
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        with self.write_lock:
+            for (s3_client, bucket, log_folder, log_name, mode), messages in pending.items():
+                if mode == "chunk":
+                    # Write the batch as a new chunk; chunk names sort by time of the flush
+                    self.chunk_count += 1
+                    body = "".join(messages)
+                    log_key = f"{log_folder}/{log_name}/log/{int(time.time() * 1000)}-{self.writer_id}-{self.chunk_count:06d}.txt"
+                else:
+                    # Write everything this writer logged so far; only checkpoints reach this point,
+                    # so the object is written once or twice per action
+                    self.written[(s3_client, bucket, log_folder, log_name)].extend(messages)
+                    body = "".join(self.written[(s3_client, bucket, log_folder, log_name)])
+                    log_key = f"{log_folder}/{log_name}-{self.writer_id}.txt"
+                try:
+                    s3_client.put_object(Bucket=bucket, Key=log_key, Body=body.encode())
+                except Exception as e:
+                    err_msg = f'{{"faasr_log":"Failed to write log {log_key}: {e}"}}\n'
+                    print(err_msg)
+
+
+# buffer shared by every call to faasr_log in this process
+log_buffer = LogBuffer()
+
 
 def faasr_log(log_message):
     """
     This function logs a message in the FaaSr log
+
+    Messages are buffered and written to S3 once the size or time threshold is reached
+    (the time threshold is also checked in the background),
+    before the function's .done marker is written, and when the process exits.
+    In "final" mode they are only written before the .done marker and when the action ends
     """
     payload = faasr_env.get_faasr()
 
@@ -20,44 +139,35 @@ def faasr_log(log_message):
 
     log_server = payload["DataStores"][log_server_name]
 
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=log_server["AccessKey"],
-        aws_secret_access_key=log_server["SecretKey"],
-        region_name=log_server["Region"],
-        endpoint_url=log_server["Endpoint"],
-    )
+    s3_client = payload.get_s3_client(log_server_name)
 
-    # Path to log file
+    # Location of the log
     log_folder = f"{payload['FaaSrLog']}/{payload['InvocationID']}"
-    log_file = f"{log_folder}/{payload['FunctionInvoke']}.txt"
-    log_path = f"/tmp/{log_file}"
-
-    if not os.path.isdir(f"/tmp/{log_folder}"):
-        try:
-            os.makedirs(f"/tmp/{log_folder}")
-        except FileExistsError:
-            print("File exists: cannot make log_folder (faasr_log)")
-
-    check_log_file = s3_client.list_objects_v2(
-        Bucket=log_server["Bucket"], Prefix=log_file
-    )
-
-    # Download the log if it exists
-    if "Content" in check_log_file and len(check_log_file["Content"]) != 0:
-        if os.path.exists(log_path):
-            os.remove(log_path)
-        s3_client.download_file(
-            Bucket=log_server["Bucket"], Key=log_file, Filename=log_path
-        )
-
-    # Write to log
-    logs = f"{log_message}\n"
-    with open(log_path, "a") as f:
-        f.write(logs)
-
-    # Upload log back to S3
-    with open(log_path, "rb") as log_data:
-        s3_client.put_object(Bucket=log_server["Bucket"], Body=log_data, Key=log_file)
-
-    # to-do logging for function completion
+    log_mode = payload.get_payload_dict().get("LogMode", "chunk")
+    if log_mode == "final":
+        # Ranks of a function write separate logs
+        from .completion import get_done_name
+        target = (s3_client, log_server["Bucket"], log_folder, get_done_name(payload.get_payload_dict()), log_mode)
+        log_buffer.append(target, f"{log_message}\n")
+        return
+
+    target = (s3_client, log_server["Bucket"], log_folder, payload["FunctionInvoke"], log_mode)
+    flush_bytes = int(payload.get_payload_dict().get("LogFlushBytes", DEFAULT_LOG_FLUSH_BYTES))
+    flush_interval = float(payload.get_payload_dict().get("LogFlushInterval", DEFAULT_LOG_FLUSH_INTERVAL))
+
+    # Add message to the buffer
+    log_buffer.append(target, f"{log_message}\n", flush_interval)
+
+    if log_buffer.should_flush(flush_bytes, flush_interval):
+        log_buffer.flush()
+
+
+def flush_log():
+    """
+    Writes all buffered log messages to S3
+    """
+    log_buffer.flush()
+
+
+# Make sure buffered messages are not lost when the action exits (including sys.exit)
+atexit.register(flush_log)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sys
+from .s3_helper_functions import s3_client_registry
+from .global_faasr import runtime
+
+# Field of an envelope that points to the stored payload
+ENVELOPE_KEY = "PayloadRef"
+
+# Local copies of resolved payloads, reused by warm containers
+PAYLOAD_CACHE_FOLDER = "/tmp/faasr_payloads"
+
+# Payload sections that hold credentials; they travel in the envelope and are never stored in S3
+SECRET_SECTIONS = ["DataStores", "ComputeServers"]
+
+# Maximum number of payloads kept in memory and in PAYLOAD_CACHE_FOLDER; every workflow run has its own payload,
+# so warm containers forget the least recently used ones
+MAX_PAYLOAD_REFERENCES = 64
+
+# digest -> canonical payload JSON, for payloads resolved or stored by this process, least recently used first
+payload_cache = {}
+
+
+def cache_payload(digest, canonical_json):
+    """
+    Keeps a payload in payload_cache as the most recently used one, forgetting the least recently used
+    payload (and removing its local copy) when the cache is full
+    """
+    payload_cache.pop(digest, None)
+    payload_cache[digest] = canonical_json
+    while len(payload_cache) > MAX_PAYLOAD_REFERENCES:
+        evicted = next(iter(payload_cache))
+        payload_cache.pop(evicted)
+        try:
+            os.remove(f"{PAYLOAD_CACHE_FOLDER}/{evicted}.json")
+        except FileNotFoundError:
+            pass
+
+
+def prune_payload_files():
+    """
+    Removes the oldest local copies beyond MAX_PAYLOAD_REFERENCES, e.g. left by an earlier process
+    """
+    with os.scandir(PAYLOAD_CACHE_FOLDER) as scan:
+        entries = sorted((entry.stat().st_mtime, entry.path) for entry in scan)
+    for _, path in entries[:max(0, len(entries) - MAX_PAYLOAD_REFERENCES)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def canonical_payload(payload_dict):
+    """
+    Returns (canonical JSON, digest) of the payload shared by all actions of an invocation
+
+    The canonical payload leaves out the credentials, FunctionInvoke and the Rank fields,
+    which are the only parts that differ between the actions
+    """
+    canonical = {key: value for key, value in payload_dict.items() if key not in SECRET_SECTIONS and key != "FunctionInvoke"}
+    canonical["FunctionList"] = {
+        func: {key: value for key, value in func_info.items() if key != "Rank"}
+        for func, func_info in payload_dict["FunctionList"].items()
+    }
+    canonical_json = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(canonical_json.encode()).hexdigest()
+    return canonical_json, digest
+
+
+def store_payload(faasr):
+    """
+    Uploads the canonical payload to the logging data store, unless it is already there
+
+    returns the envelope that successors receive instead of the payload
+    (without FunctionInvoke and Rank, which are set per successor)
+    """
+    payload_dict = faasr.get_payload_dict()
+    canonical_json, digest = canonical_payload(payload_dict)
+
+    logging_server = faasr.get_logging_server()
+    payload_key = f"{payload_dict['FaaSrLog']}/{payload_dict['InvocationID']}/payload/{digest}.json"
+
+    # The payload is content addressed, so it only has to be uploaded once per invocation
+    if digest not in payload_cache:
+        s3_client = faasr.get_s3_client(logging_server)
+        s3_client.put_object(
+            Bucket=payload_dict["DataStores"][logging_server]["Bucket"],
+            Key=payload_key,
+            Body=canonical_json.encode(),
+        )
+    cache_payload(digest, canonical_json)
+
+    envelope = {ENVELOPE_KEY: {"Key": payload_key, "Digest": digest, "DataStore": logging_server}}
+    for section in SECRET_SECTIONS:
+        envelope[section] = payload_dict[section]
+    return envelope
+
+
+def is_envelope(payload):
+    """
+    Returns True if payload is an envelope pointing to a stored payload
+    """
+    return isinstance(payload, dict) and ENVELOPE_KEY in payload
+
+
+def resolve_payload(envelope):
+    """
+    Returns the full payload for an envelope, fetching the stored payload if it is not cached
+    """
+    reference = envelope[ENVELOPE_KEY]
+    digest = reference["Digest"]
+
+    canonical_json = payload_cache.get(digest)
+    cache_path = f"{PAYLOAD_CACHE_FOLDER}/{digest}.json"
+    runtime.record("PayloadReferences", canonical_json is not None)
+
+    # Try the local copy kept by an earlier invocation in this container
+    if canonical_json is None and os.path.exists(cache_path):
+        with open(cache_path, "r") as f:
+            canonical_json = f.read()
+
+    # Otherwise, download the payload from S3
+    if canonical_json is None:
+        target_s3 = dict(envelope["DataStores"][reference["DataStore"]])
+        if not target_s3.get("Region"):
+            target_s3["Region"] = "us-east-1"
+        s3_client = s3_client_registry.get_client(target_s3)
+        response = s3_client.get_object(Bucket=target_s3["Bucket"], Key=reference["Key"])
+        canonical_json = response["Body"].read().decode()
+
+        os.makedirs(PAYLOAD_CACHE_FOLDER, exist_ok=True)
+        with open(cache_path, "w") as f:
+            f.write(canonical_json)
+        prune_payload_files()
+
+    # Make sure the stored payload is the one the envelope points to
+    if hashlib.sha256(canonical_json.encode()).hexdigest() != digest:
+        err_msg = f'{{"faasr_resolve_payload":"Payload digest mismatch for {reference["Key"]}"}}\n'
+        print(err_msg)
+        sys.exit(1)
+    cache_payload(digest, canonical_json)
+
+    # Rebuild the payload of this action
+    payload = json.loads(canonical_json)
+    for section in SECRET_SECTIONS:
+        payload[section] = envelope[section]
+    payload["FunctionInvoke"] = envelope["FunctionInvoke"]
+    if "Rank" in envelope:
+        payload["FunctionList"][envelope["FunctionInvoke"]]["Rank"] = envelope["Rank"]
+    return payload
@@ -0,0 +1,93 @@
+import io
+import time
+from .remote_file import get_remote_target
+from .s3_helper_functions import get_transfer_config, transfer_result
+
+
+def faasr_put_bytes(data, remote_file, server_name="", remote_folder=".",
+                    multipart_threshold=None, multipart_chunksize=None, max_concurrency=None):
+    """
+    This function uploads data from memory to S3, without writing it to /tmp
+
+    parameters:
+        data: bytes, str (encoded as UTF-8), or any buffer-protocol object (e.g. a bytearray,
+              memoryview or numpy array), which is read in place rather than copied
+
+    Data larger than multipart_threshold is uploaded as a multipart upload with max_concurrency
+    parts of multipart_chunksize bytes in flight (defaults come from the data store)
+
+    returns a TransferResult with the number of bytes, seconds and throughput of the upload
+    """
+    s3_client, target_s3, key = get_remote_target(remote_file, server_name, remote_folder, "faasr_put_bytes")
+    transfer_config = get_transfer_config(target_s3, multipart_threshold, multipart_chunksize, max_concurrency)
+
+    if isinstance(data, str):
+        data = data.encode()
+    body = data if isinstance(data, (bytes, bytearray)) else BufferReader(data)
+    size = len(body) if isinstance(body, (bytes, bytearray)) else body.size
+
+    start_time = time.perf_counter()
+    if size <= transfer_config.multipart_threshold:
+        # Small objects are uploaded with a single request
+        s3_client.put_object(Bucket=target_s3["Bucket"], Key=key, Body=body)
+    else:
+        if not isinstance(body, BufferReader):
+            body = BufferReader(body)
+        s3_client.upload_fileobj(body, Bucket=target_s3["Bucket"], Key=key, Config=transfer_config)
+
+    return transfer_result(size, start_time)
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over a buffer-protocol object
+
+    Reads return slices of the buffer, so the whole buffer is never copied at once;
+    uploads can seek back to retry a part
+    """
+
+    def __init__(self, data):
+        super().__init__()
+        self.view = memoryview(data).cast("B")
+        self.size = len(self.view)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"negative seek position {position}")
+        self.position = position
+        return position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        data = self.view[self.position:self.position + size].tobytes()
+        self.position += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        target = memoryview(buffer).cast("B")
+        size = min(len(target), max(0, self.size - self.position))
+        target[:size] = self.view[self.position:self.position + size]
+        self.position += size
+        return size
@@ -1,12 +1,20 @@
-import boto3
+import os
 import re
+import time
 from pathlib import Path
 from . import global_faasr as faasr_env
+from .s3_helper_functions import get_transfer_config, transfer_result
 
 
-def faasr_put_file(local_file, remote_file, server_name="", local_folder=".", remote_folder="."):
+def faasr_put_file(local_file, remote_file, server_name="", local_folder=".", remote_folder=".",
+                   multipart_threshold=None, multipart_chunksize=None, max_concurrency=None):
     """
     This function puts an object in S3 bucket
+
+    Files larger than multipart_threshold are uploaded as a multipart upload with max_concurrency
+    parts of multipart_chunksize bytes in flight (defaults come from the data store)
+
+    returns a TransferResult with the number of bytes, seconds and throughput of the upload
     """
     # to-do: config
     config = faasr_env.get_faasr()
@@ -24,6 +32,25 @@ def faasr_put_file(local_file, remote_file, server_name="", local_folder=".", re
     # Get the S3 server to put the file in
     target_s3 = config["DataStores"][server_name]
 
+    # Get the local path and S3 key of the file
+    put_file, put_file_s3 = put_file_paths(local_file, remote_file, local_folder, remote_folder)
+
+    s3_client = config.get_s3_client(server_name)
+    transfer_config = get_transfer_config(target_s3, multipart_threshold, multipart_chunksize, max_concurrency)
+
+    # Upload file to S3
+    start_time = time.perf_counter()
+    s3_client.upload_file(
+        Filename=put_file, Bucket=target_s3["Bucket"], Key=put_file_s3, Config=transfer_config
+    )
+
+    return transfer_result(os.path.getsize(put_file), start_time)
+
+
+def put_file_paths(local_file, remote_file, local_folder=".", remote_folder="."):
+    """
+    Returns the normalized local path and S3 key for uploading local_file to remote_file
+    """
     # Remove "/" in the folder & file name to avoid situations:
     # 1: duplicated "/" ("/remote/folder/", "/file_name")
     # 2: multiple "/" by user mistakes ("//remote/folder//", "file_name")
@@ -48,15 +75,4 @@ def faasr_put_file(local_file, remote_file, server_name="", local_folder=".", re
         local_file = re.sub(r"/+", "/", local_file.rstrip("/"))
         put_file = f"{local_folder}/{local_file}"
 
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=target_s3["AccessKey"],
-        aws_secret_access_key=target_s3["SecretKey"],
-        region_name=target_s3["Region"],
-        endpoint_url=target_s3["Endpoint"],
-    )
-
-    with open(put_file, 'rb') as put_data:
-        result = s3_client.put_object(
-            Bucket=target_s3["Bucket"], Body=put_data, Key=put_file_s3
-        )
+    return put_file, put_file_s3
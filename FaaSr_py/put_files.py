@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import global_faasr as faasr_env
+from .put_file import put_file_paths
+from .s3_helper_functions import get_transfer_config, transfer_result, FileResult, DEFAULT_BATCH_WORKERS
+
+
+def faasr_put_files(files, server_name="", local_folder=".", remote_folder=".",
+                    max_workers=DEFAULT_BATCH_WORKERS, multipart_threshold=None, multipart_chunksize=None,
+                    max_concurrency=None):
+    """
+    This function uploads many files to S3 concurrently
+
+    parameters:
+        files(list): (local_file, remote_file) pairs, relative to local_folder and remote_folder
+        max_workers(int): maximum number of files uploaded at the same time
+
+    returns a list of FileResult(LocalFile, RemoteFile, Result, Error) in the order of files;
+    failed uploads have Error set instead of aborting the action
+    """
+    config = faasr_env.get_faasr()
+
+    # Get the server name from payload if it is not provided
+    if server_name == "":
+        server_name = config["DefaultDataStore"]
+
+    # Ensure that the server name is valid
+    if server_name not in config["DataStores"]:
+        err_msg = '{"faasr_put_files":"Invalid data server name: ' + server_name + '"}\n'
+        print(err_msg)
+        sys.exit(1)
+
+    # Get the S3 server to put the files in
+    target_s3 = config["DataStores"][server_name]
+    s3_client = config.get_s3_client(server_name)
+    transfer_config = get_transfer_config(target_s3, multipart_threshold, multipart_chunksize, max_concurrency)
+
+    # Build the list of (local path, S3 key) to upload
+    transfers = [
+        put_file_paths(local_file, remote_file, local_folder, remote_folder)
+        for local_file, remote_file in files
+    ]
+
+    def upload(transfer):
+        put_file, put_file_s3 = transfer
+        try:
+            start_time = time.perf_counter()
+            s3_client.upload_file(
+                Filename=put_file, Bucket=target_s3["Bucket"], Key=put_file_s3, Config=transfer_config
+            )
+            return FileResult(put_file, put_file_s3, transfer_result(os.path.getsize(put_file), start_time), None)
+        except Exception as e:
+            return FileResult(put_file, put_file_s3, None, e)
+
+    # Upload files with a bounded number of workers
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(upload, transfers))
+
+    failed = sum(1 for result in results if result.Error is not None)
+    if failed:
+        err_msg = f'{{"faasr_put_files":"{failed} of {len(results)} uploads failed"}}\n'
+        print(err_msg)
+
+    return results
@@ -0,0 +1,266 @@
+import io
+import re
+import sys
+import threading
+from collections import OrderedDict
+from botocore.exceptions import ClientError
+from . import global_faasr as faasr_env
+from .s3_helper_functions import is_precondition_failed
+
+# Default size in bytes of the blocks fetched and cached by a RemoteFile
+# Can be overridden with the "RangeBlockSize" data store field
+DEFAULT_RANGE_BLOCK_SIZE = 1024 * 1024
+
+# Default number of blocks fetched ahead of sequential reads, in the same request
+# Can be overridden with the "RangeReadAhead" data store field
+DEFAULT_RANGE_READ_AHEAD = 4
+
+# Default number of blocks kept by a RemoteFile
+# Can be overridden with the "RangeCacheBlocks" data store field
+DEFAULT_RANGE_CACHE_BLOCKS = 32
+
+
+def faasr_get_range(remote_file, start=0, length=None, server_name="", remote_folder="."):
+    """
+    This function reads a byte range of a file in S3 with a single ranged GET
+
+    parameters:
+        start(int): offset of the first byte; a negative start reads the last -start bytes
+        length(int): number of bytes to read (default: up to the end of the file)
+
+    returns the bytes read, which are fewer than length if the range goes past the end of the file
+    """
+    s3_client, target_s3, key = get_remote_target(remote_file, server_name, remote_folder, "faasr_get_range")
+
+    if length is not None and length <= 0:
+        return b""
+    if start < 0:
+        if length is not None:
+            err_msg = '{\"faasr_get_range\":\"length cannot be combined with a negative start\"}\n'
+            print(err_msg)
+            sys.exit(1)
+        # "bytes=-N" selects the last N bytes
+        byte_range = f"bytes={start}"
+    elif length is None:
+        byte_range = f"bytes={start}-"
+    else:
+        byte_range = f"bytes={start}-{start + length - 1}"
+
+    try:
+        response = s3_client.get_object(Bucket=target_s3['Bucket'], Key=key, Range=byte_range)
+    except ClientError as e:
+        # The range starts past the end of the file
+        if e.response.get("Error", {}).get("Code") == "InvalidRange":
+            return b""
+        raise
+    return response["Body"].read()
+
+
+def faasr_open(remote_file, server_name="", remote_folder=".", block_size=None, read_ahead=None, cache_blocks=None):
+    """
+    This function opens a file in S3 for reading without downloading it
+
+    The returned RemoteFile is a seekable, read-only binary file object (it can be passed to
+    libraries such as pandas or pyarrow) that fetches only the blocks that are read
+
+    parameters:
+        block_size(int): size in bytes of the blocks fetched with ranged GETs
+        read_ahead(int): number of blocks fetched ahead of sequential reads
+        cache_blocks(int): number of blocks kept in memory
+        (defaults come from the data store)
+    """
+    s3_client, target_s3, key = get_remote_target(remote_file, server_name, remote_folder, "faasr_open")
+
+    if block_size is None:
+        block_size = target_s3.get("RangeBlockSize", DEFAULT_RANGE_BLOCK_SIZE)
+    if read_ahead is None:
+        read_ahead = target_s3.get("RangeReadAhead", DEFAULT_RANGE_READ_AHEAD)
+    if cache_blocks is None:
+        cache_blocks = target_s3.get("RangeCacheBlocks", DEFAULT_RANGE_CACHE_BLOCKS)
+
+    return RemoteFile(s3_client, target_s3['Bucket'], key, int(block_size), int(read_ahead), int(cache_blocks))
+
+
+def get_remote_target(remote_file, server_name, remote_folder, api_name):
+    """
+    Returns the S3 client, data store entry and key of remote_file in the data store server_name
+    """
+    config = faasr_env.get_faasr()
+
+    # Get server name if one is not provided
+    if server_name == "":
+        server_name = config['DefaultDataStore']
+
+    # Ensure that the server is a data store in the payload
+    if server_name not in config['DataStores']:
+        err_msg = '{\"' + api_name + '\":\"Invalid data server name: ' + server_name + '\"}\n'
+        print(err_msg)
+        sys.exit(1)
+
+    # Removes duplicate/trailing slashes from folder and file names
+    remote_folder = re.sub(r'/+', '/', remote_folder.rstrip('/'))
+    remote_file = re.sub(r'/+', '/', remote_file.rstrip('/'))
+    key = remote_file if remote_folder == "" else f"{remote_folder}/{remote_file}"
+
+    return config.get_s3_client(server_name), config['DataStores'][server_name], key
+
+
+class RemoteFile(io.RawIOBase):
+    """
+    Seekable, read-only file object reading an S3 object with ranged GETs
+
+    The object is read in blocks of block_size bytes, which are kept in an LRU cache of
+    cache_blocks blocks. Sequential reads fetch read_ahead more blocks in the same request,
+    and reads larger than the cache are fetched with one GET without caching them.
+    Every GET is conditional on the ETag seen when the file was opened, so a file that is
+    replaced while it is being read is never mixed with its new content
+    """
+
+    def __init__(self, s3_client, bucket, key, block_size=DEFAULT_RANGE_BLOCK_SIZE,
+                 read_ahead=DEFAULT_RANGE_READ_AHEAD, cache_blocks=DEFAULT_RANGE_CACHE_BLOCKS):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.name = key
+        self.block_size = max(1, block_size)
+        self.read_ahead = max(0, read_ahead)
+        self.cache_blocks = max(1, cache_blocks)
+
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        self.size = head["ContentLength"]
+        self.etag = head["ETag"]
+
+        self.lock = threading.Lock()
+        self.position = 0
+        # block index -> bytes, least recently used first
+        self.blocks = OrderedDict()
+        # last block read, to detect sequential reads
+        self.last_block = -1
+        self.requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"negative seek position {position}")
+        self.position = position
+        return position
+
+    def read(self, size=-1):
+        if self.closed:
+            raise ValueError("read from closed file")
+        if size is None or size < 0:
+            size = self.size - self.position
+        size = min(size, self.size - self.position)
+        if size <= 0:
+            return b""
+        data = self.read_range(self.position, size)
+        self.position += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        memoryview(buffer).cast("B")[:len(data)] = data
+        return len(data)
+
+    def peek(self, size=0):
+        """
+        Returns the bytes from the current position to the end of its block, without moving the position
+        """
+        if self.position >= self.size:
+            return b""
+        block_index = self.position // self.block_size
+        block = self.load_blocks(block_index, block_index)[block_index]
+        return block[self.position - block_index * self.block_size:]
+
+    def read_range(self, start, size):
+        """
+        Returns size bytes from start, which are within the file
+        """
+        first = start // self.block_size
+        last = (start + size - 1) // self.block_size
+
+        # Reads larger than the cache would only evict it, so they are fetched directly
+        if last - first + 1 > self.cache_blocks:
+            with self.lock:
+                self.last_block = last
+            return self.get_range(start, start + size - 1)
+
+        blocks = self.load_blocks(first, last)
+        data = b"".join(blocks[index] for index in range(first, last + 1))
+        offset = start - first * self.block_size
+        return data[offset:offset + size]
+
+    def load_blocks(self, first, last):
+        """
+        Returns the blocks first ... last, fetching the missing ones (and the read-ahead) in one GET
+        """
+        with self.lock:
+            found = {}
+            for index in range(first, last + 1):
+                if index in self.blocks:
+                    self.blocks.move_to_end(index)
+                    found[index] = self.blocks[index]
+            sequential = first in (self.last_block, self.last_block + 1)
+            self.last_block = last
+
+            missing = [index for index in range(first, last + 1) if index not in found]
+            if len(missing) == 0:
+                return found
+
+            # Extend sequential reads with the next blocks that are not cached yet
+            fetch_last = missing[-1]
+            if sequential:
+                last_index = (self.size - 1) // self.block_size
+                limit = min(last_index, last + self.read_ahead, missing[0] + self.cache_blocks - 1)
+                while fetch_last < limit and fetch_last + 1 not in self.blocks:
+                    fetch_last += 1
+
+            data = self.get_range(missing[0] * self.block_size, min(self.size, (fetch_last + 1) * self.block_size) - 1)
+            for index in range(missing[0], fetch_last + 1):
+                offset = (index - missing[0]) * self.block_size
+                block = data[offset:offset + self.block_size]
+                self.blocks[index] = block
+                self.blocks.move_to_end(index)
+                if first <= index <= last:
+                    found[index] = block
+
+            # Forget the least recently used blocks; the blocks of this read are already in found
+            while len(self.blocks) > self.cache_blocks:
+                self.blocks.popitem(last=False)
+            return found
+
+    def get_range(self, start, end):
+        """
+        Returns bytes start ... end (inclusive) of the object as it was when the file was opened
+        """
+        self.requests += 1
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket, Key=self.name, Range=f"bytes={start}-{end}", IfMatch=self.etag
+            )
+        except ClientError as e:
+            if is_precondition_failed(e):
+                err_msg = f'{{"faasr_open":"{self.name} changed while it was being read"}}\n'
+                print(err_msg)
+                sys.exit(1)
+            raise
+        return response["Body"].read()
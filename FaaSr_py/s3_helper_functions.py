@@ -1,21 +1,248 @@
 import uuid
+import hashlib
+import random
+import threading
+import time
+from collections import namedtuple
+from botocore.exceptions import ClientError
+from .tracing import instrument_client
+from .global_faasr import runtime
+
+# Default size of the connection pool kept by each S3 client
+# Can be overridden per data store with the "MaxPoolConnections" field
+DEFAULT_MAX_POOL_CONNECTIONS = 32
+
+# Default multipart transfer settings
+# Can be overridden per data store with the "MultipartThreshold", "MultipartChunksize"
+# and "MaxConcurrency" fields, or per call
+DEFAULT_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+DEFAULT_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 10
+
+# Default number of files transferred concurrently by the batch APIs
+DEFAULT_BATCH_WORKERS = 16
+
+# Default time in seconds that a successful data store check is trusted by warm invocations,
+# and default time in seconds that a single data store check may take
+# Can be overridden with the "S3CheckTTL" and "S3CheckTimeout" payload fields
+DEFAULT_S3_CHECK_TTL = 300
+DEFAULT_S3_CHECK_TIMEOUT = 10
+
+# Number of attempts of a conditional put that conflicts with concurrent writes (409),
+# and base in seconds of the jittered exponential backoff between attempts
+CONDITIONAL_PUT_ATTEMPTS = 6
+CONDITIONAL_PUT_BACKOFF = 0.05
+
+# Result of an upload or download: size in bytes, duration in seconds and throughput in bytes/second
+TransferResult = namedtuple("TransferResult", ["Bytes", "Seconds", "Throughput"])
+
+# Per-item result of a batch API: Result is set on success, Error holds the exception on failure
+FileResult = namedtuple("FileResult", ["LocalFile", "RemoteFile", "Result", "Error"])
+
+
+class S3ClientRegistry:
+    """
+    Thread-safe registry of S3 clients with one pooled client per data store
+
+    The registry lives at module level, so clients (and their open connections) are
+    reused by every server-side API call and across warm invocations of the same container
+    """
+
+    def __init__(self):
+        self.clients = {}
+        self.lock = threading.Lock()
+        # If set, called with the data store entry to create clients instead of boto3
+        # (used by the local runner to put an S3 stand-in behind every API)
+        self.client_factory = None
+
+    def get_client(self, target_s3, timeout=None):
+        """
+        Returns the S3 client for a data store, creating it on first use
+
+        parameters:
+            target_s3(dict): data store entry from the payload's DataStores
+            timeout(float): if given, a separate client is returned whose connect and read timeouts are
+                            timeout seconds and which never retries, so a request fails within 2 * timeout
+        """
+        pool_size = int(target_s3.get("MaxPoolConnections", DEFAULT_MAX_POOL_CONNECTIONS))
+        client_key = (
+            target_s3["Endpoint"],
+            target_s3["Region"],
+            target_s3["AccessKey"],
+            target_s3["SecretKey"],
+            pool_size,
+            timeout,
+        )
+
+        client = self.clients.get(client_key)
+        runtime.record("S3Clients", client is not None)
+        if client is None:
+            # boto3 clients are thread-safe, but creating them is not,
+            # so client creation is serialized with a lock
+            with self.lock:
+                client = self.clients.get(client_key)
+                if client is None and self.client_factory is not None:
+                    client = self.client_factory(target_s3)
+                    self.clients[client_key] = client
+                elif client is None:
+                    # boto3 is imported on first use, since importing it is a large part of a cold start
+                    import boto3
+                    from botocore.config import Config
+                    config = Config(max_pool_connections=pool_size)
+                    if timeout is not None:
+                        config = config.merge(Config(
+                            connect_timeout=timeout, read_timeout=timeout, retries={"total_max_attempts": 1}
+                        ))
+                    client = boto3.client(
+                        "s3",
+                        aws_access_key_id=target_s3["AccessKey"],
+                        aws_secret_access_key=target_s3["SecretKey"],
+                        region_name=target_s3["Region"],
+                        endpoint_url=target_s3["Endpoint"],
+                        config=config,
+                    )
+                    # Count requests and bytes for the tracing spans
+                    instrument_client(client)
+                    self.clients[client_key] = client
+        return client
+
+    def clear(self):
+        """
+        Drops all cached clients
+        """
+        with self.lock:
+            self.clients.clear()
+
+    def set_client_factory(self, client_factory):
+        """
+        Creates clients with client_factory(target_s3) instead of boto3 (None restores boto3)
+
+        Cached clients are dropped, so every data store gets a client from the new factory
+        """
+        with self.lock:
+            self.client_factory = client_factory
+            self.clients.clear()
+
+
+# registry shared by every FaaSr instance in this process
+s3_client_registry = S3ClientRegistry()
+
+# (endpoint, bucket, credential fingerprint) -> time.monotonic() until which the data store is known to be reachable
+verified_data_stores = {}
+
+
+def data_store_check_key(target_s3):
+    """
+    Returns the key identifying a data store check: endpoint, bucket and a fingerprint of the credentials
+    (so the secret key itself is never kept in the cache)
+    """
+    credentials = f"{target_s3['AccessKey']}:{target_s3['SecretKey']}".encode()
+    fingerprint = hashlib.sha256(credentials).hexdigest()[:16]
+    return (target_s3["Endpoint"], target_s3["Bucket"], fingerprint)
+
+
+def get_transfer_config(target_s3, multipart_threshold=None, multipart_chunksize=None, max_concurrency=None):
+    """
+    Returns the multipart transfer config for a data store
+
+    Arguments that are not None take precedence over the data store's fields,
+    which take precedence over the defaults
+
+    parameters:
+        target_s3(dict): data store entry from the payload's DataStores
+        multipart_threshold(int): size in bytes above which transfers are split into parts
+        multipart_chunksize(int): size in bytes of each part
+        max_concurrency(int): number of parts transferred in parallel
+    """
+    if multipart_threshold is None:
+        multipart_threshold = target_s3.get("MultipartThreshold", DEFAULT_MULTIPART_THRESHOLD)
+    if multipart_chunksize is None:
+        multipart_chunksize = target_s3.get("MultipartChunksize", DEFAULT_MULTIPART_CHUNKSIZE)
+    if max_concurrency is None:
+        max_concurrency = target_s3.get("MaxConcurrency", DEFAULT_MAX_CONCURRENCY)
+
+    from boto3.s3.transfer import TransferConfig
+    max_concurrency = int(max_concurrency)
+    return TransferConfig(
+        multipart_threshold=int(multipart_threshold),
+        multipart_chunksize=int(multipart_chunksize),
+        max_concurrency=max_concurrency,
+        use_threads=max_concurrency > 1,
+    )
+
+
+def transfer_result(num_bytes, start_time):
+    """
+    Returns a TransferResult for num_bytes transferred since start_time (time.perf_counter())
+    """
+    seconds = time.perf_counter() - start_time
+    throughput = num_bytes / seconds if seconds > 0 else 0.0
+    return TransferResult(num_bytes, seconds, throughput)
+
+
+def is_precondition_failed(error):
+    """
+    Returns True if a conditional request (IfNoneMatch/IfMatch) failed because its condition did not hold (412)
+    """
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code")
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code == "PreconditionFailed" or status == 412
+
+
+def is_conditional_conflict(error):
+    """
+    Returns True if a conditional write raced with another write on the same key (409);
+    S3 expects the client to retry it
+    """
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code")
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code == "ConditionalRequestConflict" or status == 409
+
+
+def conditional_put(s3_client, **kwargs):
+    """
+    Calls put_object with a condition (IfNoneMatch/IfMatch), retrying with jittered backoff
+    when the write conflicts with a concurrent one (409)
+
+    A 412 (or any other error) is raised to the caller, as is the last 409 if every attempt conflicts
+    """
+    for attempt in range(CONDITIONAL_PUT_ATTEMPTS):
+        try:
+            return s3_client.put_object(**kwargs)
+        except ClientError as e:
+            if not is_conditional_conflict(e) or attempt == CONDITIONAL_PUT_ATTEMPTS - 1:
+                raise
+        time.sleep(random.uniform(0, CONDITIONAL_PUT_BACKOFF * 2 ** attempt))
+
+
+def is_conditional_write_unsupported(error):
+    """
+    Returns True if the data store rejected a conditional write because it does not implement it
+    """
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code")
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code == "NotImplemented" or status == 501
 
-# implement locking functions
 
 # check if uuid is valid -- return boolean
 def validate_uuid(uuid_value):
     """validates uuid
-    
+
     return: boolean
     """
     # UUID is invalid if it's not a string
     if not isinstance(uuid_value, str):
         return False
-    
+
     # If uuid.UUID raises an exception, then the uuid is invalid
     try:
         uuid_check = uuid.UUID(uuid_value)
     except (ValueError):
         return False
     return True
-
@@ -0,0 +1,225 @@
+import bz2
+import lzma
+import sys
+import zlib
+from .remote_file import get_remote_target
+from .rank import faasr_rank
+
+# Default number of bytes read from the stream at a time
+# Can be overridden with the "StreamChunkSize" data store field
+DEFAULT_STREAM_CHUNK_SIZE = 1024 * 1024
+
+# File name suffixes recognized by compression="auto"
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+
+
+def faasr_iter_chunks(remote_file, server_name="", remote_folder=".", chunk_size=None, compression=None,
+                      split_by_rank=False, part=None):
+    """
+    This function streams a file from S3 over a single GET, yielding it in chunks of bytes
+
+    Only one chunk (plus the decompressor state) is held in memory at a time
+
+    parameters:
+        chunk_size(int): number of bytes read at a time (default comes from the data store)
+        compression(str): "gzip", "bz2" or "xz" to decompress the stream,
+                          or "auto" to choose from the file name suffix (default: no decompression)
+        split_by_rank(bool): only stream the slice of the file of the current rank
+        part(tuple): (rank, max_rank) of the slice to stream, counting ranks from 1
+
+    Slices are byte ranges aligned to line boundaries: each line belongs to the slice it starts in,
+    so the slices of all ranks cover every line exactly once. Compressed files cannot be split
+    """
+    s3_client, target_s3, key = get_remote_target(remote_file, server_name, remote_folder, "faasr_iter_chunks")
+    if chunk_size is None:
+        chunk_size = target_s3.get("StreamChunkSize", DEFAULT_STREAM_CHUNK_SIZE)
+    chunk_size = max(1, int(chunk_size))
+
+    if compression == "auto":
+        compression = next(
+            (name for suffix, name in COMPRESSION_SUFFIXES.items() if key.endswith(suffix)), None
+        )
+    if compression is not None and compression not in COMPRESSION_SUFFIXES.values():
+        err_msg = f'{{"faasr_iter_chunks":"Unsupported compression: {compression}"}}\n'
+        print(err_msg)
+        sys.exit(1)
+
+    if split_by_rank and part is None:
+        rank = faasr_rank()
+        if rank.Rank is not None:
+            part = (int(rank.Rank), int(rank.MaxRank))
+
+    if part is None:
+        response = s3_client.get_object(Bucket=target_s3["Bucket"], Key=key)
+        chunks = read_chunks(response["Body"], chunk_size)
+        if compression is not None:
+            chunks = decompress_chunks(chunks, compression, chunk_size)
+        yield from chunks
+        return
+
+    if compression is not None:
+        err_msg = f'{{"faasr_iter_chunks":"Compressed file {key} cannot be split by rank"}}\n'
+        print(err_msg)
+        sys.exit(1)
+    rank, max_rank = part
+    if not 1 <= rank <= max_rank:
+        err_msg = f'{{"faasr_iter_chunks":"Invalid part {rank}/{max_rank}"}}\n'
+        print(err_msg)
+        sys.exit(1)
+
+    # Nominal byte range of the slice
+    head = s3_client.head_object(Bucket=target_s3["Bucket"], Key=key)
+    size = head["ContentLength"]
+    start = size * (rank - 1) // max_rank
+    end = size * rank // max_rank
+    if start >= end:
+        return
+
+    # Read from the byte before the slice, to tell whether the slice starts at the beginning of a line.
+    # The range is open-ended, since the last line of the slice may end after the slice
+    read_from = max(0, start - 1)
+    response = s3_client.get_object(
+        Bucket=target_s3["Bucket"], Key=key, Range=f"bytes={read_from}-", IfMatch=head["ETag"]
+    )
+    try:
+        yield from align_chunks(read_chunks(response["Body"], chunk_size), read_from, start, end)
+    finally:
+        # Stop the download once the slice has been read
+        response["Body"].close()
+
+
+def faasr_iter_lines(remote_file, server_name="", remote_folder=".", encoding="utf-8", keepends=False,
+                     chunk_size=None, compression=None, split_by_rank=False, part=None):
+    """
+    This function streams a file from S3 over a single GET, yielding its lines
+
+    parameters:
+        encoding(str): encoding of the lines (None yields lines as bytes)
+        keepends(bool): keep the line endings
+        chunk_size, compression, split_by_rank, part: see faasr_iter_chunks
+
+    Memory use is bounded by the chunk size and the longest line
+    """
+    chunks = faasr_iter_chunks(
+        remote_file, server_name, remote_folder, chunk_size, compression, split_by_rank, part
+    )
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield format_line(line + b"\n", encoding, keepends)
+    if pending:
+        yield format_line(pending, encoding, keepends)
+
+
+def format_line(line, encoding, keepends):
+    """
+    Returns a line, decoded with encoding (unless it is None), without its ending unless keepends is True
+    """
+    if not keepends:
+        line = line.rstrip(b"\n")
+        if line.endswith(b"\r"):
+            line = line[:-1]
+    return line if encoding is None else line.decode(encoding)
+
+
+def read_chunks(body, chunk_size):
+    """
+    Yields the streaming body of a GET in chunks of up to chunk_size bytes
+    """
+    while True:
+        chunk = body.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def decompress_chunks(chunks, compression, chunk_size):
+    """
+    Yields the decompressed content of a compressed stream in chunks of up to chunk_size bytes
+
+    Concatenated streams (e.g. several gzip members) are decompressed one after the other
+    """
+    def new_decompressor():
+        if compression == "gzip":
+            # wbits 16 + MAX_WBITS expects a gzip header
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if compression == "bz2":
+            return bz2.BZ2Decompressor()
+        return lzma.LZMADecompressor()
+
+    decompressor = new_decompressor()
+    for data in chunks:
+        while True:
+            # Decompress at most chunk_size bytes at a time; the rest of the input waits in the decompressor
+            output = decompressor.decompress(data, chunk_size)
+            if compression == "gzip":
+                data = decompressor.unconsumed_tail
+                more = len(data) > 0
+            else:
+                data = b""
+                more = not decompressor.needs_input and not decompressor.eof
+            if output:
+                yield output
+            if decompressor.eof:
+                # The input after the end of the stream is in unused_data (zlib also leaves it in unconsumed_tail)
+                data = decompressor.unused_data
+                decompressor = new_decompressor()
+                more = len(data) > 0
+            if not more:
+                break
+    if compression == "gzip":
+        output = decompressor.flush()
+        if output:
+            yield output
+
+
+def align_chunks(chunks, offset, start, end):
+    """
+    Yields the part of a stream that holds the lines starting in [start, end)
+
+    parameters:
+        chunks: chunks of the file, the first of which starts at offset (start - 1, or 0 if start is 0)
+    """
+    position = offset
+    # A slice that does not start the file starts after the first line ending at or after start - 1
+    skipping = start > 0
+    # Once the end is reached, the slice continues until the end of its last line
+    finishing = False
+
+    for chunk in chunks:
+        chunk_start = 0
+        if skipping:
+            newline = chunk.find(b"\n")
+            if newline == -1:
+                position += len(chunk)
+                continue
+            skipping = False
+            chunk_start = newline + 1
+            if position + chunk_start >= end:
+                # The line that crosses the slice starts before it, and the next line starts after it
+                return
+
+        if not finishing:
+            # Bytes before end are always part of the slice
+            before_end = min(len(chunk), end - position)
+            if before_end > chunk_start:
+                yield chunk[chunk_start:before_end]
+                chunk_start = before_end
+                if chunk[before_end - 1:before_end] == b"\n" and position + before_end == end:
+                    # The slice ends with a complete line
+                    return
+            if position + len(chunk) < end:
+                position += len(chunk)
+                continue
+            finishing = True
+
+        # Past the end, complete the last line of the slice
+        newline = chunk.find(b"\n", chunk_start)
+        if newline != -1:
+            yield chunk[chunk_start:newline + 1]
+            return
+        if chunk_start < len(chunk):
+            yield chunk[chunk_start:]
+        position += len(chunk)
@@ -0,0 +1,182 @@
+import atexit
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+class RequestCounter:
+    """
+    Counts the S3 requests of this process and the bytes they sent and received
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def record(self, bytes_sent=0, bytes_received=0):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+
+    def add_received(self, bytes_received):
+        with self.lock:
+            self.bytes_received += bytes_received
+
+    def snapshot(self):
+        with self.lock:
+            return self.requests, self.bytes_sent, self.bytes_received
+
+
+class Tracer:
+    """
+    Records the phases (spans) of the current action and writes them to the logging data store
+
+    Each span holds its start and end time and the S3 requests and bytes made while it was open.
+    Spans are written as JSON lines in a single put to
+    {FaaSrLog}/{InvocationID}/trace/{FunctionInvoke}[.rank]-{id}.jsonl when the action ends,
+    if the payload sets "Tracing": true
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.spans = []
+        self.action = {}
+        self.target = None
+
+    def reset(self):
+        """
+        Drops the spans of the previous action
+        """
+        with self.lock:
+            self.spans = []
+            self.action = {}
+            self.target = None
+
+    def set_action(self, faasr):
+        """
+        Identifies the current action and, if tracing is enabled, where its trace is written
+        """
+        payload_dict = faasr.get_payload_dict()
+        func = payload_dict["FunctionInvoke"]
+        rank = payload_dict["FunctionList"].get(func, {}).get("Rank") or None
+        with self.lock:
+            self.action = {"InvocationID": payload_dict["InvocationID"], "FunctionInvoke": func, "Rank": rank}
+            self.target = None
+            if payload_dict.get("Tracing", False):
+                logging_server = faasr.get_logging_server()
+                trace_name = func if rank is None else f"{func}.{rank.split('/')[0]}"
+                self.target = (
+                    faasr.get_s3_client(logging_server),
+                    payload_dict["DataStores"][logging_server]["Bucket"],
+                    f"{payload_dict['FaaSrLog']}/{payload_dict['InvocationID']}/trace/{trace_name}-{uuid.uuid4().hex[:8]}.jsonl",
+                )
+
+    @contextmanager
+    def span(self, name):
+        """
+        Records the phase name while the with-block runs
+        """
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(name)
+
+        status = "ok"
+        start_counts = request_counter.snapshot()
+        start = time.time()
+        try:
+            yield
+        except SystemExit as e:
+            status = "exit" if e.code not in (None, 0) else "ok"
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            end = time.time()
+            end_counts = request_counter.snapshot()
+            stack.pop()
+            with self.lock:
+                self.spans.append({
+                    "Span": name,
+                    "Parent": parent,
+                    "Start": start,
+                    "End": end,
+                    "Seconds": end - start,
+                    "Requests": end_counts[0] - start_counts[0],
+                    "BytesSent": end_counts[1] - start_counts[1],
+                    "BytesReceived": end_counts[2] - start_counts[2],
+                    "Status": status,
+                })
+
+    def flush(self):
+        """
+        Writes the recorded spans in one put and clears them
+        """
+        with self.lock:
+            spans, self.spans = self.spans, []
+            action, target = self.action, self.target
+        if target is None or len(spans) == 0:
+            return
+        s3_client, bucket, trace_key = target
+        body = "".join(json.dumps(dict(action, **span)) + "\n" for span in spans)
+        try:
+            s3_client.put_object(Bucket=bucket, Key=trace_key, Body=body.encode())
+        except Exception as e:
+            err_msg = f'{{"faasr_trace":"Failed to write trace {trace_key}: {e}"}}\n'
+            print(err_msg)
+
+
+# counter and tracer shared by every action in this process
+request_counter = RequestCounter()
+tracer = Tracer()
+
+
+def trace_span(name):
+    """
+    Returns a context manager recording the phase name of the current action
+    """
+    return tracer.span(name)
+
+
+def record_request(bytes_sent=0, bytes_received=0):
+    """
+    Counts one S3 request
+    """
+    request_counter.record(bytes_sent, bytes_received)
+
+
+def instrument_client(s3_client):
+    """
+    Counts the requests of a boto3 S3 client and their bytes with botocore events
+    """
+    def on_send(request, **kwargs):
+        # Called for every attempt with the prepared request, which carries the Content-Length
+        request_counter.record(int(request.headers.get("Content-Length") or 0), 0)
+
+    def on_download(parsed, **kwargs):
+        # Downloads (including the ranged parts of multipart downloads) report their size in ContentLength
+        content_length = parsed.get("ContentLength") if isinstance(parsed, dict) else None
+        if content_length:
+            request_counter.add_received(int(content_length))
+
+    s3_client.meta.events.register("before-send.s3", on_send)
+    s3_client.meta.events.register("after-call.s3.GetObject", on_download)
+
+
+def flush_trace():
+    """
+    Writes the spans of the current action to the logging data store (if tracing is enabled)
+    """
+    tracer.flush()
+
+
+# Make sure the trace of an action that aborts (sys.exit) is written
+atexit.register(flush_trace)
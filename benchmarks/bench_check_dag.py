@@ -0,0 +1,153 @@
+"""
+Benchmark for the workflow DAG analysis (check_dag)
+
+Times analyze_dag and check_dag on generated workflows of increasing size and compares them
+with the previous recursive implementation, which is kept here as a reference.
+check_dag is timed with an empty analysis cache (first action of a workflow in a process)
+and with the analysis cached by an earlier action; the speedup is legacy / check_dag without cache
+
+usage: python benchmarks/bench_check_dag.py [--sizes 1000 10000 50000]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from FaaSr_py.graph_functions import analyze_dag, check_dag
+from FaaSr_py.global_faasr import runtime
+
+
+def chain_workflow(size):
+    """
+    F0 -> F1 -> ... -> F{size-1}
+    """
+    function_list = {}
+    for i in range(size):
+        invoke_next = [f"F{i + 1}"] if i + 1 < size else []
+        function_list[f"F{i}"] = {"InvokeNext": invoke_next}
+    return {"FunctionList": function_list, "FunctionInvoke": f"F{size - 1}"}
+
+
+def layered_workflow(size, width=100):
+    """
+    Layers of width functions, each function invoking every function of the next layer
+    """
+    layers = [[f"L{j}_{i}" for i in range(width)] for j in range(max(1, size // width))]
+    function_list = {"Start": {"InvokeNext": list(layers[0])}}
+    for j, layer in enumerate(layers):
+        next_layer = layers[j + 1] if j + 1 < len(layers) else []
+        for func in layer:
+            function_list[func] = {"InvokeNext": list(next_layer)}
+    return {"FunctionList": function_list, "FunctionInvoke": layers[-1][0]}
+
+
+def fan_out_workflow(size):
+    """
+    One function invoking size ranked functions, which all invoke one join function
+    """
+    function_list = {"Start": {"InvokeNext": [f"Map{i}(4)" for i in range(size)]}}
+    for i in range(size):
+        function_list[f"Map{i}"] = {"InvokeNext": ["Join"]}
+    function_list["Join"] = {"InvokeNext": []}
+    return {"FunctionList": function_list, "FunctionInvoke": "Join"}
+
+
+def legacy_check_dag(payload):
+    """
+    Previous recursive implementation of check_dag, used as the baseline
+    """
+    adj_graph = defaultdict(list)
+    for func in payload['FunctionList'].keys():
+        invoke_next = payload['FunctionList'][func]['InvokeNext']
+        if isinstance(invoke_next, str):
+            invoke_next = [invoke_next]
+        for child in invoke_next:
+            child = re.sub(r"\(.*", "", child)
+            adj_graph[func].append(child)
+
+    def is_cyclic(curr, visited, stack):
+        if curr in stack:
+            return True
+        visited.add(curr)
+        stack.append(curr)
+        for child in adj_graph[curr]:
+            if child not in visited and is_cyclic(child, visited, stack):
+                return True
+            elif child in stack:
+                return True
+        stack.pop()
+        return False
+
+    pre = defaultdict(list)
+    for func1 in list(adj_graph):
+        for func2 in adj_graph[func1]:
+            pre[func2].append(func1)
+    first_func = next(func for func in payload['FunctionList'] if len(pre[func]) == 0)
+    visited = set()
+    is_cyclic(first_func, visited, [])
+    return pre[payload['FunctionInvoke']]
+
+
+def uncached_check_dag(payload):
+    """
+    check_dag with an empty DAG analysis cache, so the digest and the analysis are both computed
+    """
+    runtime.dag_analyses.clear()
+    return check_dag(payload)
+
+
+def time_calls(funcs, payload, repeat):
+    """
+    Returns the best time of repeat calls of each function in seconds, or the name of the exception raised
+
+    The functions are called in turn on every repeat, so changes in machine load affect them alike
+    """
+    best = [None] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            if best[i] == "RecursionError":
+                continue
+            start = time.perf_counter()
+            try:
+                func(payload)
+            except RecursionError:
+                best[i] = "RecursionError"
+                continue
+            elapsed = time.perf_counter() - start
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the current implementation")
+    args = parser.parse_args()
+
+    print(
+        f"{'workflow':<10}{'functions':>12}{'analyze_dag (s)':>18}{'check_dag (s)':>16}"
+        f"{'cached (s)':>14}{'legacy (s)':>16}{'speedup':>10}"
+    )
+    for name, generator in [("chain", chain_workflow), ("layered", layered_workflow), ("fan-out", fan_out_workflow)]:
+        for size in args.sizes:
+            payload = generator(size)
+            funcs = [lambda payload: analyze_dag(payload["FunctionList"]), uncached_check_dag, check_dag]
+            if not args.skip_legacy:
+                funcs.append(legacy_check_dag)
+            analyze, uncached, cached, *legacy = time_calls(funcs, payload, args.repeat)
+            legacy = legacy[0] if legacy else "-"
+            speedup = f"{legacy / uncached:.2f}x" if isinstance(legacy, float) else "-"
+            legacy = f"{legacy:.6f}" if isinstance(legacy, float) else legacy
+            print(
+                f"{name:<10}{len(payload['FunctionList']):>12}{analyze:>18.6f}{uncached:>16.6f}"
+                f"{cached:>14.6f}{legacy:>16}{speedup:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark for the cold import time of FaaSr_py
+
+Every measurement runs in a new interpreter, as in a cold container, and times the import
+statements of a scenario with time.perf_counter. With --baseline, the same scenarios are timed
+against the FaaSr_py of another commit (extracted with git archive), so the cost can be
+compared before and after a change
+
+scenarios:
+    package:     import FaaSr_py
+    rank:        the package and faasr_rank, as a user function calling only server-side APIs
+    start:       the package and faasr_start, as the entrypoint of an action
+    s3_client:   faasr_start and the first S3 client, which loads boto3
+    all_modules: every module of the package
+
+usage: python benchmarks/bench_import.py [--baseline HEAD~1] [--repeat 20] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SCENARIOS = {
+    "package": "import FaaSr_py",
+    "rank": "import FaaSr_py; FaaSr_py.faasr_rank",
+    "start": "from FaaSr_py import faasr_start",
+    "s3_client": (
+        "from FaaSr_py import faasr_start\n"
+        "from FaaSr_py.s3_helper_functions import s3_client_registry\n"
+        "s3_client_registry.get_client({'Endpoint': 'http://localhost', 'Region': 'us-east-1', "
+        "'AccessKey': 'key', 'SecretKey': 'secret'})"
+    ),
+    "all_modules": "import FaaSr_py\nfor name in FaaSr_py.__all__: getattr(FaaSr_py, name)",
+}
+
+# Third-party modules reported as loaded (or not) by each scenario
+HEAVY_MODULES = ["boto3", "requests", "jsonschema"]
+
+TIMER = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(root, statement, repeat):
+    """
+    Times statement in repeat new interpreters with root on sys.path
+
+    returns the import times in seconds and the heavy modules the statement loaded
+    """
+    code = TIMER.format(root=os.path.abspath(root), statement=statement, heavy=HEAVY_MODULES)
+    times = []
+    loaded = []
+    for _ in range(repeat):
+        # -B keeps the timed runs from writing bytecode; warm_up has compiled it already
+        completed = subprocess.run([sys.executable, "-B", "-c", code], capture_output=True, text=True, cwd=root)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip())
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        loaded = result["loaded"]
+    return times, loaded
+
+
+def warm_up(root):
+    """
+    Compiles the package once, so timed runs read bytecode like an installed package
+    """
+    subprocess.run([sys.executable, "-m", "compileall", "-q", os.path.join(root, "FaaSr_py")], check=True)
+
+
+def extract_revision(revision, folder):
+    """
+    Extracts the FaaSr_py package of a git revision into folder
+    """
+    archive = os.path.join(folder, "faasr_py.tar")
+    with open(archive, "wb") as f:
+        subprocess.run(["git", "archive", revision, "FaaSr_py"], stdout=f, check=True, cwd=REPO_ROOT)
+    with tarfile.open(archive) as tar:
+        tar.extractall(folder)
+
+
+def bench_tree(label, root, scenarios, repeat):
+    """
+    Times every scenario against the package under root
+    """
+    warm_up(root)
+    results = {}
+    for name in scenarios:
+        times, loaded = time_import(root, SCENARIOS[name], repeat)
+        results[name] = {
+            "min_ms": min(times) * 1000,
+            "median_ms": statistics.median(times) * 1000,
+            "loaded": loaded,
+        }
+        print(f"{label} {name}: {results[name]['median_ms']:.1f} ms", file=sys.stderr)
+    return results
+
+
+def git_commit(revision="HEAD"):
+    """
+    Returns the commit of revision, or None outside a git checkout
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", revision], capture_output=True, text=True, check=True, cwd=REPO_ROOT,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--baseline", help="git revision to compare with (e.g. HEAD~1)")
+    parser.add_argument("--repeat", type=int, default=10, help="interpreters started per scenario")
+    parser.add_argument("--output", help="file to write the JSON results to (default: stdout)")
+    args = parser.parse_args()
+
+    report = {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": {"current": bench_tree("current", REPO_ROOT, args.scenarios, args.repeat)},
+    }
+
+    if args.baseline:
+        report["metadata"]["baseline"] = git_commit(args.baseline)
+        with tempfile.TemporaryDirectory(prefix="faasr-import-") as folder:
+            extract_revision(args.baseline, folder)
+            report["results"]["baseline"] = bench_tree("baseline", folder, args.scenarios, args.repeat)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""
+Benchmarks for the orchestration hot paths of FaaSr_py
+
+Runs against the local S3 stand-in with an injected per-request latency, and against a
+local HTTP endpoint that accepts OpenWhisk invocations, so results are reproducible without
+cloud resources. Results are written as JSON, so they can be compared between versions
+
+suites:
+    lock:    faasr_acquire/faasr_release latency under K concurrent contenders
+    fanin:   abort_on_multiple_invocations for a join behind N ranks, and tree fan-in
+    log:     faasr_log throughput versus number and size of messages
+    dag:     check_dag time versus workflow size
+    trigger: trigger() throughput versus fan-out width
+
+The FaaSr schema is not part of the package: as for an action, FaaSr.schema.json is read from
+the current working directory, so run the benchmark from a directory that contains it
+
+usage: python benchmarks/bench_orchestration.py [--suites lock fanin] [--output results.json]
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import FaaSr_py
+from FaaSr_py import global_faasr, log
+from FaaSr_py.faasr_payload import FaaSr
+from FaaSr_py.fan_in_tree import climb_tree
+from FaaSr_py.graph_functions import check_dag
+from FaaSr_py.local_s3 import MemoryS3Client
+from FaaSr_py.s3_helper_functions import s3_client_registry
+from bench_check_dag import chain_workflow, layered_workflow, fan_out_workflow, uncached_check_dag
+
+
+class LatencyS3Client(MemoryS3Client):
+    """
+    In-memory S3 stand-in that adds a fixed latency to every request and counts requests
+    """
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.requests = 0
+        self.count_lock = threading.Lock()
+
+    def request(self):
+        with self.count_lock:
+            self.requests += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def put_object(self, *args, **kwargs):
+        self.request()
+        return super().put_object(*args, **kwargs)
+
+    def get_object(self, *args, **kwargs):
+        self.request()
+        return super().get_object(*args, **kwargs)
+
+    def head_object(self, *args, **kwargs):
+        self.request()
+        return super().head_object(*args, **kwargs)
+
+    def head_bucket(self, *args, **kwargs):
+        self.request()
+        return super().head_bucket(*args, **kwargs)
+
+    def delete_object(self, *args, **kwargs):
+        self.request()
+        return super().delete_object(*args, **kwargs)
+
+    def delete_objects(self, *args, **kwargs):
+        self.request()
+        return super().delete_objects(*args, **kwargs)
+
+    def list_objects_v2(self, *args, **kwargs):
+        self.request()
+        return super().list_objects_v2(*args, **kwargs)
+
+
+class AcceptingHandler(BaseHTTPRequestHandler):
+    """
+    Accepts every invocation with 202, like a non-blocking OpenWhisk invocation
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(202)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class InvokeEndpoint(ThreadingHTTPServer):
+    """
+    HTTP server for the mocked invoke endpoint
+    (with a listen backlog large enough for every concurrent trigger, so connections are not retried)
+    """
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def start_invoke_endpoint():
+    """
+    Starts the mocked invoke endpoint in a background thread and returns the server
+    """
+    server = InvokeEndpoint(("127.0.0.1", 0), AcceptingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_payload(function_list, function_invoke, endpoint="http://127.0.0.1:1"):
+    """
+    Returns a workflow payload using data store S and OpenWhisk compute server OW
+    """
+    return {
+        "ComputeServers": {
+            "OW": {"FaaSType": "OpenWhisk", "Endpoint": endpoint, "Namespace": "bench", "API.key": "user:key", "SSL": "false"}
+        },
+        "DataStores": {
+            "S": {"Endpoint": "http://localhost", "Bucket": "bench", "Region": "us-east-1", "AccessKey": "a", "SecretKey": "s"}
+        },
+        "DefaultDataStore": "S",
+        "LoggingDataStore": None,
+        "FaaSrLog": "FaaSrLog",
+        "InvocationID": "bench",
+        "FunctionInvoke": function_invoke,
+        "FunctionList": function_list,
+    }
+
+
+def summarize(values):
+    """
+    Returns count, mean, median, 95th percentile and maximum of a list of measurements
+    """
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def use_store(latency):
+    """
+    Puts a new latency-injecting store behind every S3 client and returns it
+    """
+    store = LatencyS3Client(latency)
+    s3_client_registry.set_client_factory(lambda target_s3: store)
+    FaaSr_py.faasr_lock.held_locks.clear()
+    return store
+
+
+def bench_lock(args):
+    """
+    K contenders acquire and release the same lock once, starting at the same time
+    """
+    results = []
+    for backend in args.lock_backends:
+        for contenders in args.contenders:
+            store = use_store(args.s3_latency)
+            payload = base_payload({"F": {"FaaSServer": "OW", "InvokeNext": []}}, "F")
+            payload["DataStores"]["S"]["LockBackend"] = backend
+            faasr = FaaSr(payload)
+            barrier = threading.Barrier(contenders)
+
+            def contend(_):
+                barrier.wait()
+                start = time.perf_counter()
+                FaaSr_py.faasr_acquire(faasr)
+                acquired = time.perf_counter() - start
+                FaaSr_py.faasr_release(faasr)
+                return acquired
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=contenders) as executor:
+                latencies = list(executor.map(contend, range(contenders)))
+            results.append({
+                "backend": backend,
+                "contenders": contenders,
+                "total_seconds": time.perf_counter() - start,
+                "acquire_seconds": summarize(latencies),
+                "s3_requests": store.requests,
+            })
+    return results
+
+
+def bench_fanin(args):
+    """
+    N ranks of Map feed Join: every rank's Join invocation runs the completion check and election,
+    and, separately, N ranks report into a fan-in tree
+    """
+    results = []
+    for ranks in args.ranks:
+        function_list = {
+            "Start": {"FaaSServer": "OW", "InvokeNext": [f"Map({ranks})"]},
+            "Map": {"FaaSServer": "OW", "InvokeNext": ["Join"]},
+            "Join": {"FaaSServer": "OW", "InvokeNext": []},
+        }
+        for backend in args.lock_backends:
+            store = use_store(args.s3_latency)
+            for rank in range(1, ranks + 1):
+                store.put_object(Bucket="bench", Key=f"FaaSrLog/bench/done/Map.{rank}.done", Body=b"True")
+            store.requests = 0
+            payload = base_payload(function_list, "Join")
+            payload["DataStores"]["S"]["LockBackend"] = backend
+            pre = check_dag(payload)
+
+            def join(_):
+                faasr = FaaSr(copy.deepcopy(payload))
+                start = time.perf_counter()
+                try:
+                    faasr.abort_on_multiple_invocations(list(pre))
+                    won = True
+                except SystemExit:
+                    won = False
+                return time.perf_counter() - start, won
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=min(ranks, args.max_threads)) as executor:
+                outcomes = list(executor.map(join, range(ranks)))
+            results.append({
+                "mode": f"join-{backend}",
+                "ranks": ranks,
+                "total_seconds": time.perf_counter() - start,
+                "invocation_seconds": summarize([seconds for seconds, _ in outcomes]),
+                "winners": sum(1 for _, won in outcomes if won),
+                "join_invocations": ranks,
+                "s3_requests": store.requests,
+            })
+
+        for arity in args.arities:
+            store = use_store(args.s3_latency)
+
+            def report(index):
+                start = time.perf_counter()
+                root = climb_tree(store, "bench", "FaaSrLog/bench", "Map", index, ranks, arity)
+                return time.perf_counter() - start, root
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=min(ranks, args.max_threads)) as executor:
+                outcomes = list(executor.map(report, range(ranks)))
+            results.append({
+                "mode": f"tree-{arity}",
+                "ranks": ranks,
+                "total_seconds": time.perf_counter() - start,
+                "invocation_seconds": summarize([seconds for seconds, _ in outcomes]),
+                "winners": sum(1 for _, root in outcomes if root),
+                "join_invocations": sum(1 for _, root in outcomes if root),
+                "s3_requests": store.requests,
+            })
+    return results
+
+
+def bench_log(args):
+    """
+    One action logs M messages of a given size, then flushes
+    """
+    results = []
+    for log_mode in ["chunk", "final"]:
+        for messages in args.log_messages:
+            for size in args.log_sizes:
+                store = use_store(args.s3_latency)
+                payload = base_payload({"F": {"FaaSServer": "OW", "InvokeNext": []}}, "F")
+                payload["LogMode"] = log_mode
+                global_faasr.initialize_faasr(payload)
+                message = "x" * size
+
+                start = time.perf_counter()
+                for _ in range(messages):
+                    FaaSr_py.faasr_log(message)
+                logged = time.perf_counter() - start
+                log.flush_log()
+                total = time.perf_counter() - start
+
+                results.append({
+                    "mode": log_mode,
+                    "messages": messages,
+                    "message_bytes": size,
+                    "log_seconds": logged,
+                    "total_seconds": total,
+                    "messages_per_second": messages / total,
+                    "bytes_per_second": messages * size / total,
+                    "s3_requests": store.requests,
+                })
+    return results
+
+
+def bench_dag(args):
+    """
+    check_dag on generated workflows of increasing size, without a cached DAG analysis
+    """
+    results = []
+    for name, generator in [("chain", chain_workflow), ("layered", layered_workflow), ("fan-out", fan_out_workflow)]:
+        for size in args.dag_sizes:
+            payload = generator(size)
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                uncached_check_dag(payload)
+                timings.append(time.perf_counter() - start)
+            results.append({
+                "workflow": name,
+                "functions": len(payload["FunctionList"]),
+                "seconds": min(timings),
+            })
+    return results
+
+
+def bench_trigger(args):
+    """
+    An action triggers W ranks of its successor through the mocked OpenWhisk endpoint
+    """
+    server = start_invoke_endpoint()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    results = []
+    try:
+        for by_reference in [False, True]:
+            for width in args.widths:
+                store = use_store(args.s3_latency)
+                function_list = {
+                    "F": {"FaaSServer": "OW", "InvokeNext": [f"G({width})"]},
+                    "G": {"FaaSServer": "OW", "InvokeNext": []},
+                }
+                payload = base_payload(function_list, "F", endpoint)
+                payload["PayloadByReference"] = by_reference
+                faasr = global_faasr.initialize_faasr(payload)
+                FaaSr_py.payload_reference.payload_cache.clear()
+
+                start = time.perf_counter()
+                trigger_results = faasr.trigger()
+                seconds = time.perf_counter() - start
+                results.append({
+                    "payload_by_reference": by_reference,
+                    "width": width,
+                    "seconds": seconds,
+                    "invocations_per_second": width / seconds,
+                    "accepted": sum(1 for result in trigger_results if result.Success),
+                    "s3_requests": store.requests,
+                })
+    finally:
+        server.shutdown()
+    return results
+
+
+SUITES = {
+    "lock": bench_lock,
+    "fanin": bench_fanin,
+    "log": bench_log,
+    "dag": bench_dag,
+    "trigger": bench_trigger,
+}
+
+
+def git_commit():
+    """
+    Returns the commit of the working tree, or None outside a git checkout
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", choices=list(SUITES), default=list(SUITES))
+    parser.add_argument("--output", help="file to write the JSON results to (default: stdout)")
+    parser.add_argument("--s3-latency", type=float, default=0.005, help="seconds added to every S3 request")
+    parser.add_argument("--contenders", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--lock-backends", nargs="+", default=["conditional"], choices=["conditional", "flag"],
+                        help="the flag backend backs off for seconds per attempt, so it is slow with many contenders")
+    parser.add_argument("--ranks", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--arities", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--max-threads", type=int, default=64, help="concurrent invocations in the fan-in suite")
+    parser.add_argument("--log-messages", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--log-sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--dag-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--widths", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    report = {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "s3_latency": args.s3_latency,
+        },
+        "results": {},
+    }
+
+    # Actions print their progress; keep it out of the results
+    try:
+        for suite in args.suites:
+            with contextlib.redirect_stdout(io.StringIO()):
+                report["results"][suite] = SUITES[suite](args)
+            print(f"{suite}: done", file=sys.stderr)
+    finally:
+        s3_client_registry.set_client_factory(None)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import pytest
+from FaaSr_py import faasr_payload
+from FaaSr_py.faasr_lock import held_locks
+from FaaSr_py.local_s3 import MemoryS3Client, client_error
+from FaaSr_py.s3_helper_functions import s3_client_registry
+
+BUCKET = "faasr-test"
+
+
+class ConflictingS3Client(MemoryS3Client):
+    """
+    MemoryS3Client whose first conflicts conditional puts fail with 409 ConditionalRequestConflict,
+    as S3 does when conditional writes on the same key race
+    """
+
+    def __init__(self, conflicts):
+        super().__init__()
+        self.conflicts = conflicts
+
+    def put_object(self, **kwargs):
+        if "IfNoneMatch" in kwargs or "IfMatch" in kwargs:
+            with self.lock:
+                conflict = self.conflicts > 0
+                self.conflicts -= 1
+            if conflict:
+                raise client_error("ConditionalRequestConflict", 409, "PutObject")
+        return super().put_object(**kwargs)
+
+
+def make_payload(function_list, function_invoke, lock_backend=None):
+    """
+    Returns a minimal workflow payload whose data store is the S3 stand-in
+    """
+    data_store = {
+        "Endpoint": "http://local", "Region": "us-east-1", "Bucket": BUCKET,
+        "AccessKey": "key", "SecretKey": "secret",
+    }
+    if lock_backend is not None:
+        data_store["LockBackend"] = lock_backend
+    return {
+        "FaaSrLog": "FaaSrLog",
+        "InvocationID": "test",
+        "FunctionInvoke": function_invoke,
+        "FunctionList": function_list,
+        "ComputeServers": {},
+        "DataStores": {"S3": data_store},
+        "DefaultDataStore": "S3",
+        "LoggingDataStore": None,
+    }
+
+
+@pytest.fixture
+def s3_store():
+    """
+    Puts a new in-memory store behind every S3 client
+    """
+    store = MemoryS3Client()
+    s3_client_registry.set_client_factory(lambda target_s3: store)
+    held_locks.clear()
+    yield store
+    s3_client_registry.set_client_factory(None)
+    held_locks.clear()
+
+
+@pytest.fixture
+def make_faasr(monkeypatch):
+    """
+    Returns a function building FaaSr instances from payloads without loading the FaaSr schema
+    """
+    monkeypatch.setattr(faasr_payload, "validate_json", lambda payload: True)
+    return faasr_payload.FaaSr
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from FaaSr_py.local_s3 import MemoryS3Client, client_error
+from conftest import BUCKET, ConflictingS3Client, make_payload
+
+ID_FOLDER = "FaaSrLog/test"
+
+
+def elect(make_faasr, s3_client, contenders, rank=None):
+    """
+    Runs the election of join function J from contenders threads at the same time and returns their results
+    """
+    function_list = {"A": {"InvokeNext": ["J"]}, "B": {"InvokeNext": ["J"]}, "J": {"InvokeNext": []}}
+    if rank is not None:
+        function_list["J"]["Rank"] = rank
+    barrier = threading.Barrier(contenders)
+
+    def attempt(_):
+        faasr = make_faasr(make_payload(function_list, "J"))
+        barrier.wait()
+        return faasr.elect_winner(s3_client, BUCKET, ID_FOLDER)
+
+    with ThreadPoolExecutor(max_workers=contenders) as executor:
+        return list(executor.map(attempt, range(contenders)))
+
+
+def test_exactly_one_winner(make_faasr):
+    results = elect(make_faasr, MemoryS3Client(), 16)
+    assert results.count(True) == 1
+    assert results.count(False) == 15
+
+
+def test_winner_when_every_first_put_conflicts(make_faasr):
+    # Every contender first gets a 409, which must be retried rather than counted as a loss
+    results = elect(make_faasr, ConflictingS3Client(conflicts=16), 16)
+    assert results.count(True) == 1
+    assert results.count(False) == 15
+
+
+def test_ranks_are_elected_separately(make_faasr):
+    s3_client = MemoryS3Client()
+    for rank in ("1/3", "2/3", "3/3"):
+        results = elect(make_faasr, s3_client, 4, rank)
+        assert results.count(True) == 1
+    winners = [key for key in s3_client.list_keys(BUCKET) if key.endswith(".winner")]
+    assert sorted(winners) == [f"{ID_FOLDER}/J.{rank}.winner" for rank in (1, 2, 3)]
+
+
+def test_unsupported_conditional_writes(make_faasr):
+    class NoConditionalS3Client(MemoryS3Client):
+        def put_object(self, **kwargs):
+            if "IfNoneMatch" in kwargs:
+                raise client_error("NotImplemented", 501, "PutObject")
+            return super().put_object(**kwargs)
+
+    assert elect(make_faasr, NoConditionalS3Client(), 2) == [None, None]
@@ -0,0 +1,118 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from FaaSr_py import faasr_lock
+from FaaSr_py.faasr_lock import try_lock, get_lock_name, held_locks
+from conftest import BUCKET, ConflictingS3Client, make_payload
+
+LOCK_KEY = "FaaSrLog/test/F./lock"
+
+
+class CountingS3Client:
+    """
+    Counts the requests sent to an S3 client
+    """
+
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+        self.requests = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.s3_client, name)
+
+        def call(**kwargs):
+            self.requests += 1
+            return method(**kwargs)
+        return call
+
+
+def contend(s3_client, contenders, lock_ttl=60):
+    """
+    Runs try_lock from contenders threads at the same time and returns their results
+    """
+    barrier = threading.Barrier(contenders)
+
+    def attempt(owner):
+        barrier.wait()
+        return try_lock(s3_client, BUCKET, LOCK_KEY, f"owner-{owner}", lock_ttl)
+
+    with ThreadPoolExecutor(max_workers=contenders) as executor:
+        return list(executor.map(attempt, range(contenders)))
+
+
+def read_lock(s3_client):
+    return json.loads(s3_client.get_object(Bucket=BUCKET, Key=LOCK_KEY)["Body"].read())
+
+
+def test_contending_threads_create_lock_once(s3_store):
+    tokens = contend(s3_store, 16)
+    assert sorted(tokens, key=str) == [1] + [None] * 15
+
+
+def test_expired_lock_is_taken_over_once(s3_store):
+    assert try_lock(s3_store, BUCKET, LOCK_KEY, "crashed", 0) == 1
+
+    tokens = contend(s3_store, 16)
+    assert sorted(tokens, key=str) == [2] + [None] * 15
+    assert read_lock(s3_store)["Token"] == 2
+
+
+def test_held_lock_is_not_taken_over(s3_store):
+    assert try_lock(s3_store, BUCKET, LOCK_KEY, "holder", 60) == 1
+    assert contend(s3_store, 8) == [None] * 8
+
+
+def test_flag_lock_is_held(s3_store):
+    # The flag backend writes the flag number as the body of the lock
+    s3_store.put_object(Bucket=BUCKET, Key=LOCK_KEY, Body="12345")
+    assert try_lock(s3_store, BUCKET, LOCK_KEY, "owner", 60) is None
+
+
+def test_conflicting_puts_are_retried():
+    s3_client = ConflictingS3Client(conflicts=3)
+    assert try_lock(s3_client, BUCKET, LOCK_KEY, "owner", 60) == 1
+
+
+def test_release_lets_next_action_acquire(s3_store, make_faasr):
+    faasr = make_faasr(make_payload({"F": {"InvokeNext": []}}, "F"))
+    assert get_lock_name(faasr) == LOCK_KEY
+
+    assert faasr_lock.faasr_acquire(faasr) == 1
+    faasr_lock.faasr_release(faasr)
+    assert read_lock(s3_store)["Released"] is True
+    assert LOCK_KEY not in held_locks
+
+    assert try_lock(s3_store, BUCKET, LOCK_KEY, "next", 60) == 2
+
+
+def test_release_after_expiry_keeps_new_holder(s3_store, make_faasr, capsys):
+    payload = make_payload({"F": {"InvokeNext": []}}, "F")
+    payload["LockTTL"] = 0
+    faasr = make_faasr(payload)
+
+    assert faasr_lock.faasr_acquire(faasr) == 1
+    # The lease expired, so another action takes the lock over before the release
+    # (the other action runs in another process, so it does not change held_locks here)
+    acquired = dict(held_locks)
+    assert try_lock(s3_store, BUCKET, LOCK_KEY, "new-holder", 60) == 2
+    held_locks.update(acquired)
+
+    faasr_lock.faasr_release(faasr)
+    assert "lease expired before release" in capsys.readouterr().out
+    lock_state = read_lock(s3_store)
+    assert lock_state["Owner"] == "new-holder"
+    assert lock_state["Released"] is False
+
+
+def test_request_counts(s3_store, make_faasr):
+    # The first acquisition creates the lock; later ones take over the released lock object
+    faasr = make_faasr(make_payload({"F": {"InvokeNext": []}}, "F"))
+    counting = CountingS3Client(s3_store)
+
+    assert try_lock(counting, BUCKET, LOCK_KEY, "first", 60) == 1
+    assert counting.requests == 1
+    faasr_lock.faasr_release(faasr)
+
+    counting.requests = 0
+    assert try_lock(counting, BUCKET, LOCK_KEY, "second", 60) == 2
+    assert counting.requests == 3
@@ -0,0 +1,76 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from FaaSr_py.fan_in_tree import climb_tree, group_complete, tree_marker_key, report_to_tree
+from FaaSr_py.local_s3 import MemoryS3Client
+from conftest import BUCKET, ConflictingS3Client, make_payload
+
+ID_FOLDER = "FaaSrLog/test"
+ARITIES = range(2, 9)
+RANK_COUNTS = list(range(1, 34)) + [64, 65, 100]
+
+
+@pytest.mark.parametrize("arity", ARITIES)
+@pytest.mark.parametrize("ranks", RANK_COUNTS)
+def test_last_rank_completes_root(arity, ranks):
+    s3_client = MemoryS3Client()
+    order = list(range(ranks))
+    random.Random(arity * 1000 + ranks).shuffle(order)
+
+    results = [climb_tree(s3_client, BUCKET, ID_FOLDER, "F", index, ranks, arity) for index in order]
+    # Until the last rank finishes some group is incomplete, and the last rank always completes the root
+    assert results == [False] * (ranks - 1) + [True]
+
+
+@pytest.mark.parametrize("arity", [2, 3, 8])
+@pytest.mark.parametrize("ranks", [2, 7, 16, 33])
+@pytest.mark.parametrize("conflicts", [0, 4])
+def test_concurrent_ranks_complete_root_once(arity, ranks, conflicts):
+    s3_client = ConflictingS3Client(conflicts)
+    barrier = threading.Barrier(ranks)
+
+    def finish(index):
+        barrier.wait()
+        return climb_tree(s3_client, BUCKET, ID_FOLDER, "F", index, ranks, arity)
+
+    with ThreadPoolExecutor(max_workers=ranks) as executor:
+        results = list(executor.map(finish, range(ranks)))
+    assert results.count(True) == 1
+
+
+@pytest.mark.parametrize("arity", ARITIES)
+@pytest.mark.parametrize("ranks", [1, 2, 5, 17, 64])
+def test_group_complete(arity, ranks):
+    s3_client = MemoryS3Client()
+    groups = [(first, min(arity, ranks - first)) for first in range(0, ranks, arity)]
+    missing = random.Random(ranks).randrange(ranks)
+
+    for index in range(ranks):
+        if index != missing:
+            s3_client.put_object(Bucket=BUCKET, Key=tree_marker_key(ID_FOLDER, "F", 0, index), Body=b"")
+    for first, size in groups:
+        expected = not first <= missing < first + size
+        assert group_complete(s3_client, BUCKET, ID_FOLDER, "F", 0, first, size) is expected
+
+    s3_client.put_object(Bucket=BUCKET, Key=tree_marker_key(ID_FOLDER, "F", 0, missing), Body=b"")
+    for first, size in groups:
+        assert group_complete(s3_client, BUCKET, ID_FOLDER, "F", 0, first, size)
+
+
+def test_report_to_tree(s3_store, make_faasr):
+    ranks = 10
+    results = []
+    for rank in range(1, ranks + 1):
+        function_list = {
+            "F": {"InvokeNext": ["G"], "FanInTreeArity": 3, "Rank": f"{rank}/{ranks}"},
+            "G": {"InvokeNext": []},
+        }
+        results.append(report_to_tree(make_faasr(make_payload(function_list, "F"))))
+    assert results == [False] * (ranks - 1) + [True]
+
+
+def test_functions_without_tree_always_trigger(s3_store, make_faasr):
+    function_list = {"F": {"InvokeNext": ["G"], "Rank": "1/4"}, "G": {"InvokeNext": []}}
+    assert report_to_tree(make_faasr(make_payload(function_list, "F")))
+    assert s3_store.list_keys(BUCKET) == []